@@ -1,37 +1,350 @@
-from flask import Flask, request, render_template
+from flask import Flask, request, render_template, Response, stream_with_context
+import os
+import sys
 import threading
 import time
 import requests
 import numpy as np
-from sklearn.mixture import GaussianMixture
-from sklearn.preprocessing import StandardScaler
 import datetime
+import json
+import queue
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from trainer import BackgroundTrainer
+from detector import save_checkpoint, load_latest_checkpoint
+from ringBuffer import RingBuffer, STATUSES
+from tsStore import TimeSeriesStore
+from snapshot import SnapshotWriter, SnapshotReader, acquire_singleton
+from shard import ShardedCollector, TickMerger
+from fleet import ControllerPool, ControllerDetectors, parse_controllers
+from rates import counter_rates, port_duration
+from scheduler import AdaptiveScheduler
+from flowFeatures import FlowFeatures, flow_record, is_flow_column
+from mitigation import MitigationEngine, offending_columns, column_z
+from metrics import REGISTRY, CONTENT_TYPE
+from modelSelection import select_model
+from topology import TopologyRegistry
 
 app = Flask(__name__)
 BASE_URL = "http://127.0.0.1:8080"
+# Nhiều controller Ryu: "c0=http://10.0.0.1:8080,c1=http://10.0.0.2:8080" (rỗng: chỉ BASE_URL)
+CONTROLLERS = parse_controllers(os.environ.get('SDN_CONTROLLERS'), BASE_URL)
+CONTROLLER_MODELS = True  # Thêm mô hình riêng cho từng controller bên cạnh mô hình toàn hệ thống
 DURATION_TRAIN = 20  # Thời gian thu thập mẫu để huấn luyện GMM (giây)
 T_SAMPLING = 0.5     # Khoảng thời gian giữa các lần lấy mẫu (giây)
 MAX_SAMPLES = 200    # Số mẫu tối đa lưu trữ để cập nhật GMM và scaler
+STATS_WORKERS = 32   # Số luồng tối đa gửi yêu cầu portstats song song
+ROUND_DEADLINE = 0.8 * T_SAMPLING  # Hạn chót cho mỗi vòng lấy mẫu (giây)
+USE_BATCH_STATS = True  # Lấy portstats của mọi switch trong một lần gọi POST /portstats
+COLLECT_MODE = 'push'  # 'push': Ryu tự thăm dò và gửi delta qua /samples, 'pull': app thăm dò qua REST,
+                       # 'sharded': N tiến trình shard thăm dò qua REST, ghép theo tick
+N_SHARDS = 4         # Số tiến trình shard ở chế độ 'sharded'
+MERGE_GRACE = 0.2    # Thời gian chờ thêm cho shard chậm trước khi ghép một tick (giây)
+ADAPTIVE_SAMPLING = True       # Chu kỳ thăm dò riêng cho từng switch theo điểm bất thường/độ biến thiên (push, pull)
+MIN_INTERVAL = T_SAMPLING      # Chu kỳ nhanh nhất khi có sự cố (không nhỏ hơn T_SAMPLING)
+MAX_INTERVAL = 8 * T_SAMPLING  # Chu kỳ chậm nhất khi yên
+POLL_BUDGET = 200              # Tổng số yêu cầu stats mỗi giây tới controller
+MITIGATION = False           # Tự cài rule giới hạn/chặn cho cổng, flow vi phạm khi có warning
+MITIGATION_ACTION = 'meter'  # 'meter': giới hạn tốc độ, 'drop': chặn hẳn
+MITIGATION_RATE = 1000       # Tốc độ tối đa của meter (kbps)
+MITIGATION_Z = 3.0           # Chế độ global: cột vi phạm khi đặc trưng vượt trung bình bao nhiêu độ lệch chuẩn
+MITIGATION_IDLE = 10         # idle_timeout của rule (giây)
+MITIGATION_HARD = 60         # hard_timeout của rule (giây)
+SELECT_EVERY = None          # Chạy chọn mô hình định kỳ (giây), None: chỉ khi gọi POST /model/select
+SELECT_CRITERION = 'heldout' # 'heldout': log-likelihood trên các tick cuối, 'bic'
+SELECT_WORKERS = None        # Số tiến trình thử ứng viên (mặc định: số lõi)
+SELECT_SAMPLES = 2000        # Số mẫu lấy từ kho dữ liệu khi chọn trên dữ liệu đã lưu
+FLOW_FEATURES = True  # Thêm cột đặc trưng flow "dpid-flows", "dpid-dist" của mỗi switch (chỉ chế độ global)
+UPDATE_MODE = 'online'  # 'online': cập nhật GMM theo từng mẫu, 'refit': huấn luyện lại toàn bộ mỗi mẫu
+REFIT_EVERY = 120    # Số mẫu giữa hai lần huấn luyện lại toàn bộ ở chế độ online (0 = tắt)
+REMAP_REFIT_AFTER = 40  # Có cổng mới: mô hình cũ chấm tiếp trên các cột cũ, huấn luyện lại sau ngần này tick
+TRAINER_PROCESSES = False  # Huấn luyện ở tiến trình riêng (tránh GIL) thay vì luồng riêng
+FEATURE_MODE = 'global'  # 'global': một vector ghép mọi cổng, 'port': một GMM 4 chiều dùng chung, chấm điểm từng cổng
+PORT_FEATURES = 4    # rx_packets, tx_packets, rx_bytes, tx_bytes
+FEATURE_UNITS = 'rate'  # Đặc trưng là tốc độ mỗi giây theo duration của switch (mô hình cũ dùng 'delta')
+SCORE_MODE = 'likelihood'  # 'likelihood': log-likelihood so với ngưỡng phân vị, 'component': so với thành phần normal (chế độ global)
+THRESHOLD_PERCENTILE = 1.0  # Phân vị log-likelihood (ngoài mẫu ở chế độ global) dùng làm ngưỡng
+COVARIANCE_TYPE = 'full'  # 'full', 'tied', 'diag' hoặc 'spherical' ('diag' rẻ hơn nhiều khi có nhiều cổng)
+PROJECTION = None    # Giảm chiều trước GMM: None, 'ipca' hoặc 'random'
+PROJECTION_DIM = 16
+PERSIST_SAMPLES = True  # Ghi mọi mẫu và kết quả xuống đĩa, khởi động lại từ dữ liệu đã lưu
+STORE_DIR = 'data/samples'
+MODEL_DIR = 'data/models'  # Lưu checkpoint scaler+GMM sau mỗi lần huấn luyện (None = tắt)
+KEEP_CHECKPOINTS = 5
+# Vai trò tiến trình: 'all' (một tiến trình, chế độ phát triển), 'collector' (tiến trình
+# lấy mẫu duy nhất, ghi snapshot) hoặc 'api' (worker phục vụ dashboard, đọc snapshot)
+ROLE = os.environ.get('SDN_ROLE', 'all')
+COLLECTOR_URL = os.environ.get('SDN_COLLECTOR_URL', 'http://127.0.0.1:5001')
+LOG_LEVEL = os.environ.get('SDN_LOG_LEVEL', 'INFO')  # DEBUG in cả vector đặc trưng (theo mẫu LOG_EVERY)
+LOG_EVERY = 20       # Chỉ ghi log tick bình thường mỗi LOG_EVERY tick; tick warning luôn được ghi
+SNAPSHOT_PATH = 'data/run/snapshot.txt'
+COLLECTOR_LOCK = 'data/run/collector.lock'
 
 connected_dpids = set()
+dpids_lock = threading.Lock()
 sampling_enabled = threading.Event()
-prev_features = {}
-gmm_model = None
-scaler = None
+prev_features = {}   # "dpid-port" -> (bộ đếm, duration) lần trước
+detector = None      # Bộ scaler + GMM + thành phần normal hiện tại
 sampling_start_time = None
-feature_vectors = []
-predictions = []
-normal_component = None  # Lưu chỉ số thành phần normal
+samples = None       # RingBuffer chứa MAX_SAMPLES vector gần nhất cùng thời gian/trạng thái
+samples_since_refit = 0
+layout_ticks = 0     # Số tick kể từ lần bố cục cột thay đổi gần nhất
+topology = TopologyRegistry()  # Lược đồ cột ổn định (cổng -> chỉ số cột), nối thêm theo sự kiện của Ryu
+_impute_cache = (None, None, None)  # (mô hình, bố cục cột, giá trị điền bù)
+row_cache = {}       # seq -> bản ghi JSON đã mã hóa sẵn của MAX_SAMPLES dòng gần nhất
+published_seq = 0    # Các dòng có seq < published_seq đã có trạng thái cuối cùng
+new_rows = threading.Condition()
+scheduler = (AdaptiveScheduler(T_SAMPLING, MIN_INTERVAL, MAX_INTERVAL, POLL_BUDGET)
+             if ADAPTIVE_SAMPLING and COLLECT_MODE != 'sharded' else None)
+use_flow_features = FLOW_FEATURES and FEATURE_MODE == 'global'
+flow_features = FlowFeatures() if use_flow_features and COLLECT_MODE == 'pull' else None
+sample_queue = queue.Queue(maxsize=16)  # Các lô delta do Ryu đẩy tới, chờ luồng lấy mẫu xử lý
+snapshot_writer = SnapshotWriter(SNAPSHOT_PATH) if ROLE == 'collector' else None
+snapshot_reader = SnapshotReader(SNAPSHOT_PATH) if ROLE == 'api' else None
+collector_lock = None
+sharder = None
+
+# Session dùng chung để tái sử dụng kết nối HTTP (collector); mỗi Ryu có session riêng trong controllers
+http = requests.Session()
+http.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=STATS_WORKERS))
+controllers = ControllerPool(CONTROLLERS, STATS_WORKERS)
+# Chế độ push với nhiều controller: ghép các lô cùng tick (theo đồng hồ) thành một mẫu
+push_merger = (TickMerger(T_SAMPLING, ROUND_DEADLINE, MERGE_GRACE, lambda deltas, now: enqueue_sample(deltas, now))
+               if COLLECT_MODE == 'push' and len(controllers) > 1 else None)
+stats_pool = ThreadPoolExecutor(max_workers=STATS_WORKERS, thread_name_prefix='portstats')
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s %(levelname)s %(message)s')
+log = logging.getLogger('sdn')
+
+TICK_SECONDS = REGISTRY.histogram('sdn_tick_seconds', "Time to process one sample (append, score/update, publish)")
+SCORE_SECONDS = REGISTRY.histogram('sdn_score_seconds', "GMM scoring plus online update time per tick")
+ROUND_SECONDS = REGISTRY.histogram('sdn_collect_round_seconds', "Pull-mode collection round time")
+REQUEST_SECONDS = REGISTRY.histogram('sdn_stats_request_seconds', "HTTP stats request time to Ryu", ('route',))
+SWITCH_MISSED = REGISTRY.counter('sdn_switch_missed_total', "Switches that missed the round deadline or failed")
+TICK_OVERRUNS = REGISTRY.counter('sdn_tick_overruns_total', "Ticks that started late because the previous one overran")
+SAMPLES_DROPPED = REGISTRY.counter('sdn_samples_dropped_total', "Pushed samples dropped because the queue was full")
+STATUS_TOTAL = REGISTRY.counter('sdn_samples_total', "Processed samples by status", ('status',))
+BUFFER_SAMPLES = REGISTRY.gauge('sdn_buffer_samples', "Samples in the ring buffer")
+BUFFER_WIDTH = REGISTRY.gauge('sdn_buffer_width', "Features per sample")
+QUEUE_DEPTH = REGISTRY.gauge('sdn_sample_queue_depth', "Samples waiting to be processed")
+CACHED_ROWS = REGISTRY.gauge('sdn_cached_rows', "Encoded rows kept for clients")
+SWITCHES = REGISTRY.gauge('sdn_switches', "Connected switches")
+
+mitigation = (MitigationEngine(controllers, action=MITIGATION_ACTION, rate_kbps=MITIGATION_RATE,
+                               idle_timeout=MITIGATION_IDLE, hard_timeout=MITIGATION_HARD,
+                               flow_features=flow_features, timeout=ROUND_DEADLINE)
+              if MITIGATION else None)
+
+def install_detector(model):
+    # Thay mô hình mới vào một lần; luồng lấy mẫu tiếp tục dùng mô hình cũ cho tới tick sau
+    global detector, samples_since_refit
+    # Mô hình vừa huấn luyện chưa có metadata như checkpoint; ghi rõ để model_compatible nhận
+    model.metadata.update(feature_mode=FEATURE_MODE, feature_units=FEATURE_UNITS)
+    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    log.info(f"[TRAIN] GMM trained at {current_time} with {model.n_samples} samples, {model.n_features} features, normal_component={model.normal_component}")
+    if MODEL_DIR:
+        # Lưu trước khi công bố: sau đó luồng lấy mẫu cập nhật online ngay trên đối tượng
+        # này, ghi song song sẽ ra checkpoint lẫn tham số trước và sau cập nhật
+        try:
+            path = save_checkpoint(model, MODEL_DIR, keep=KEEP_CHECKPOINTS, feature_mode=FEATURE_MODE,
+                                   port_features=PORT_FEATURES, t_sampling=T_SAMPLING,
+                                   feature_units=FEATURE_UNITS)
+            log.info(f"[TRAIN] Model checkpoint saved to {path}")
+        except Exception as e:
+            log.error(f"Saving model checkpoint failed: {e}")
+    detector = model
+    samples_since_refit = 0
+
+def model_compatible(model, columns=None):
+    # Chế độ port dùng chung mô hình 4 chiều; chế độ global cần đúng bố cục cột
+    if model.metadata.get('feature_mode', FEATURE_MODE) != FEATURE_MODE:
+        return False
+    if model.metadata.get('feature_units', 'delta') != FEATURE_UNITS:
+        return False
+    if FEATURE_MODE == 'port':
+        return model.n_features == PORT_FEATURES
+    if columns is not None:
+        # Lược đồ cột chỉ nối thêm: mô hình trên các cột đầu vẫn chấm được các cột đó
+        columns = list(columns)
+        return model.columns is not None and model.columns == columns[:len(model.columns)]
+    return model.columns is not None and model.n_features == PORT_FEATURES * len(model.columns)
+
+def load_checkpoint():
+    # Nạp mô hình tương thích mới nhất để chấm điểm ngay khi khởi động
+    global detector, sampling_start_time
+    model, path = load_latest_checkpoint(MODEL_DIR, model_compatible)
+    if model is None:
+        return
+    model.score_mode = SCORE_MODE
+    if model.columns and FEATURE_MODE != 'port':
+        # Bố cục cột theo mô hình đã lưu, không theo thứ tự khóa của tick đầu tiên
+        topology.extend(model.columns)
+    detector = model
+    sampling_start_time = time.time() - DURATION_TRAIN
+    log.info(f"[TRAIN] Loaded model checkpoint {path} ({model.n_features} features, normal_component={model.normal_component})")
+
+trainer = BackgroundTrainer(install_detector, use_processes=TRAINER_PROCESSES,
+                            params={'score_mode': SCORE_MODE, 'threshold_percentile': THRESHOLD_PERCENTILE,
+                                    'covariance_type': COVARIANCE_TYPE, 'projection': PROJECTION,
+                                    'projection_dim': PROJECTION_DIM})
+controller_detectors = (ControllerDetectors(trainer.params, PORT_FEATURES, FEATURE_MODE, TRAINER_PROCESSES)
+                        if CONTROLLER_MODELS and len(controllers) > 1 else None)
+store = TimeSeriesStore(STORE_DIR, PORT_FEATURES) if PERSIST_SAMPLES else None
+selection_lock = threading.Lock()  # Chỉ một lượt chọn mô hình chạy tại một thời điểm
+
+def training_matrix(ring):
+    # Chế độ port: mỗi cổng ở mỗi tick là một dòng, không phụ thuộc số cổng hiện có.
+    # Cả hai trường hợp đều là view trên bộ đệm, không sao chép.
+    X = ring.values()
+    if FEATURE_MODE == 'port':
+        return X.reshape(-1, PORT_FEATURES)
+    return X
+
+def rows_per_tick(ring):
+    # Số dòng huấn luyện của một tick (để hiệu chỉnh ngưỡng theo tick ở chế độ port)
+    return len(ring.columns) if FEATURE_MODE == 'port' else 1
+
+def submit_training(ring):
+    trainer.submit(training_matrix(ring), ring.columns, rows_per_tick(ring))
+
+def current_dpids():
+    if ROLE == 'api':
+        return sorted(snapshot_reader.refresh().header['dpids'])
+    with dpids_lock:
+        return sorted(connected_dpids)
+
+def forward_to_collector(path):
+    # Worker API không giữ trạng thái lấy mẫu, chuyển yêu cầu ghi cho collector
+    try:
+        res = http.post(f"{COLLECTOR_URL}{path}", data=request.get_data(),
+                        headers={'Content-Type': 'application/json'}, timeout=2)
+        return Response(res.content, status=res.status_code, content_type='application/json')
+    except Exception as e:
+        return {'error': f"Collector unavailable: {e}"}, 503
+
+def write_snapshot():
+    if snapshot_writer is None:
+        return
+    # Đọc trạng thái và ghi trong cùng một khóa để bản cũ không ghi đè bản mới hơn
+    with snapshot_writer.lock:
+        end = published_seq
+        rows = [row_cache.get(seq) for seq in range(max(end - MAX_SAMPLES, 0), end)]
+        try:
+            snapshot_writer.write(end, [row for row in rows if row is not None],
+                                  current_dpids(), sampling_enabled.is_set())
+        except Exception as e:
+            log.error(f"Writing snapshot failed: {e}")
 
 @app.route('/switch', methods=['POST'])
 def receive_switch_info():
+    if ROLE == 'api':
+        return forward_to_collector('/switch')
     data = request.get_json()
     dpid = data.get('dpid')
     if dpid:
-        connected_dpids.add(str(dpid))
-        print(f"Switch connected: {dpid}")
+        controllers.assign(dpid, data.get('controller'))
+        with dpids_lock:
+            connected_dpids.add(str(dpid))
+        if sharder is not None:
+            sharder.assign(current_dpids(), controllers.url_for)
+        write_snapshot()
+        log.info(f"Switch connected: {dpid} (controller {controllers.controller_for(dpid).name})")
+    return {'status': 'received'}, 200
+
+@app.route('/switch/down', methods=['POST'])
+def receive_switch_down():
+    # Ryu báo datapath mất kết nối: bỏ khỏi vòng thăm dò ngay, cột của switch được điền bù
+    if ROLE == 'api':
+        return forward_to_collector('/switch/down')
+    data = request.get_json()
+    dpid = str(data.get('dpid'))
+    with dpids_lock:
+        connected_dpids.discard(dpid)
+    keys = topology.switch_columns(dpid)
+    forget_columns(keys, dpid)
+    if sharder is not None:
+        sharder.assign(current_dpids(), controllers.url_for)
+    write_snapshot()
+    log.info(f"Switch disconnected: {dpid}")
+    return {'status': 'received'}, 200
+
+@app.route('/port', methods=['POST'])
+def receive_port_status():
+    # Port status của Ryu: {"dpid", "port", "reason": "add"|"delete"|"modify", "live"}
+    if ROLE == 'api':
+        return forward_to_collector('/port')
+    data = request.get_json()
+    if data.get('port') == 4294967294:
+        # OFPP_LOCAL không có trong vector đặc trưng (như poll_deltas)
+        return {'status': 'ignored'}, 200
+    live = bool(data.get('live'))
+    key = topology.port_status(data.get('dpid'), data.get('port'), live)
+    if not live:
+        forget_columns([key])
+    log.info(f"Port {key} {data.get('reason')}: {'up' if live else 'down'}")
     return {'status': 'received'}, 200
 
+def forget_columns(keys, dpid=None):
+    # Không tính tốc độ từ bộ đếm cũ và không điền tốc độ cũ cho cổng/switch đã mất
+    for key in keys:
+        prev_features.pop(key, None)
+    if scheduler is not None:
+        scheduler.forget(dpid, keys)
+    if dpid is not None and flow_features is not None:
+        flow_features.forget(dpid)
+
+@app.route('/sampling/start', methods=['POST'])
+def start_sampling():
+    if ROLE == 'api':
+        return forward_to_collector('/sampling/start')
+    sampling_enabled.set()
+    write_snapshot()
+    return {'status': 'sampling'}, 200
+
+@app.route('/model/select', methods=['POST'])
+def start_model_selection():
+    # {"criterion": "heldout"|"bic", "source": "buffer"|"store"}; chạy nền, lấy mẫu không dừng
+    if ROLE == 'api':
+        return forward_to_collector('/model/select')
+    data = request.get_json(silent=True) or {}
+    if selection_lock.locked():
+        return {'status': 'running'}, 409
+    threading.Thread(target=run_model_selection, name='model-selection', daemon=True,
+                     args=(data.get('criterion', SELECT_CRITERION), data.get('source', 'buffer'))).start()
+    return {'status': 'started'}, 202
+
+@app.route('/samples', methods=['POST'])
+def receive_samples():
+    # Lô delta của mọi cổng trong một vòng thăm dò của Ryu:
+    # {"time": ..., "controller": ..., "deltas": {"dpid-port": [...]}}
+    if ROLE == 'api':
+        return forward_to_collector('/samples')
+    data = request.get_json()
+    deltas, now = data.get('deltas', {}), data.get('time', time.time())
+    if push_merger is not None:
+        # Vòng thăm dò của các Ryu căn theo bội số T_SAMPLING, cùng tick thì cùng mẫu
+        name = data.get('controller', controllers.default)
+        controllers.seen(name)
+        if not push_merger.add(round(now / T_SAMPLING), name, deltas):
+            SAMPLES_DROPPED.inc()
+            log.warning(f"Samples from controller {name} arrived after merge, dropped")
+            return {'status': 'dropped'}, 503
+        push_merger.flush(controllers.active(5 * T_SAMPLING))
+    elif not enqueue_sample(deltas, now):
+        return {'status': 'dropped'}, 503
+    if scheduler is not None:
+        # Ryu dùng chu kỳ trả về để chọn switch cần thăm dò ở các vòng sau
+        return {'status': 'received', 'schedule': scheduler.schedule()}, 200
+    return {'status': 'received'}, 200
+
+def enqueue_sample(deltas, now):
+    try:
+        sample_queue.put_nowait((deltas, now))
+        return True
+    except queue.Full:
+        SAMPLES_DROPPED.inc()
+        log.warning("Sample queue full, dropping sample")
+        return False
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     global sampling_enabled
@@ -44,14 +357,18 @@ def index():
         action = request.form.get('action')
 
         if action == 'start_sampling':
-            sampling_enabled.set()
+            if ROLE == 'api':
+                forward_to_collector('/sampling/start')
+            else:
+                sampling_enabled.set()
+                write_snapshot()
             return render_template("sampling.html", 
-                                 connected_dpids=sorted(connected_dpids),
+                                 connected_dpids=current_dpids(),
                                  results=[])
 
         try:
             if action in ['flowstats', 'portstats', 'tablestats']:
-                r = requests.post(f"{BASE_URL}/{action}/{selected_dpid}", json={"dpid": int(selected_dpid)})
+                r = requests.post(f"{controllers.url_for(selected_dpid)}/{action}/{selected_dpid}", json={"dpid": int(selected_dpid)})
                 result = r.json()
 
             elif action == 'flowmod':
@@ -88,143 +405,515 @@ def index():
                     "strict": strict
                 }
 
-                r = requests.post(f"{BASE_URL}/flowmod", json=payload)
+                r = requests.post(f"{controllers.url_for(selected_dpid)}/flowmod", json=payload)
                 flow_result = r.json()
 
         except Exception as e:
             result = {"error": str(e)}
 
     return render_template("index.html",
-                         connected_dpids=sorted(connected_dpids),
+                         connected_dpids=current_dpids(),
                          selected_dpid=selected_dpid,
                          result=result,
                          flow_result=flow_result)
 
+def warm_start():
+    # Nạp lại MAX_SAMPLES mẫu gần nhất từ đĩa và huấn luyện ngay,
+    # không phải chờ thêm DURATION_TRAIN giây thu thập
+    global samples, sampling_start_time
+    history = store.tail(MAX_SAMPLES)
+    if history is None or len(history['timestamp']) < 20:
+        return
+    columns = history['columns']
+    topology.extend(columns)
+    samples = RingBuffer(MAX_SAMPLES, PORT_FEATURES * len(columns), columns,
+                         n_flags=len(columns) if FEATURE_MODE == 'port' else 0)
+    for ts, code, vector in zip(history['timestamp'], history['status'], history['vector']):
+        samples.append(vector, ts, STATUSES[code])
+    if samples.columns != topology.columns:
+        # Lược đồ đã có từ checkpoint: sắp lại dữ liệu đã lưu theo đúng các chỉ số đó
+        samples = samples.remap(topology.columns, PORT_FEATURES)
+    if detector is None or not model_compatible(detector, samples.columns):
+        submit_training(samples)
+    sampling_start_time = time.time() - DURATION_TRAIN
+    log.info(f"[TRAIN] Warm start from {len(samples)} stored samples with {len(columns)} ports")
+
+def flush_push_merger():
+    # Phát tick đã quá hạn chót khi có controller không gửi mẫu
+    while True:
+        time.sleep(T_SAMPLING / 4)
+        push_merger.flush(controllers.active(5 * T_SAMPLING))
+
+def persist_row(ring, i, p_normal):
+    try:
+        store.append(ring.timestamps[i], ring.status[i], ring.data[i], ring.columns, p_normal, ring.flags[i])
+    except Exception as e:
+        log.error(f"Persisting sample failed: {e}")
+
+def publish_row(ring, i, seq, controller_status=None):
+    # Mã hóa mỗi dòng một lần, mọi client dùng chung bản đã mã hóa
+    global published_seq
+    record = {
+        'seq': seq,
+        'time': datetime.datetime.fromtimestamp(ring.timestamps[i]).strftime("%Y-%m-%d %H:%M:%S"),
+        'vector': ring.data[i].tolist(),
+        'status': STATUSES[ring.status[i]],
+        'anomalous_ports': [ring.columns[j] for j in np.flatnonzero(ring.flags[i])]
+    }
+    if controller_status:
+        record['controllers'] = controller_status
+    row_cache[seq] = json.dumps(record)
+    row_cache.pop(seq - MAX_SAMPLES, None)
+    with new_rows:
+        published_seq = seq + 1
+        new_rows.notify_all()
+    write_snapshot()
+
+def rows_since(since):
+    if ROLE == 'api':
+        return snapshot_reader.refresh().rows_since(since)
+    end = published_seq
+    start = max(since, end - MAX_SAMPLES, 0)
+    rows = (row_cache.get(seq) for seq in range(start, end))
+    return [row for row in rows if row is not None], end
+
+@app.route('/metrics')
+def metrics():
+    # Số đo dạng Prometheus; worker API chuyển tiếp tới collector
+    if ROLE == 'api':
+        try:
+            res = http.get(f"{COLLECTOR_URL}/metrics", timeout=2)
+            return Response(res.content, status=res.status_code, content_type=CONTENT_TYPE)
+        except Exception as e:
+            return {'error': f"Collector unavailable: {e}"}, 503
+    ring = samples
+    BUFFER_SAMPLES.set(len(ring) if ring is not None else 0)
+    BUFFER_WIDTH.set(ring.width if ring is not None else 0)
+    QUEUE_DEPTH.set(sample_queue.qsize())
+    CACHED_ROWS.set(len(row_cache))
+    SWITCHES.set(len(current_dpids()))
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/sampling_data')
 def sampling_data():
-    return {'results': predictions}
+    # ?since=<seq> chỉ trả về các dòng mới hơn con trỏ, "next" là con trỏ cho lần gọi sau
+    rows, end = rows_since(request.args.get('since', 0, type=int))
+    return Response('{"results": [' + ', '.join(rows) + '], "next": %d}' % end,
+                    content_type='application/json')
 
-def collect_port_stats():
-    global prev_features, gmm_model, scaler, sampling_start_time, feature_vectors, predictions, normal_component
-    while True:
-        time.sleep(T_SAMPLING)
+@app.route('/history')
+def history():
+    # Truy vấn dữ liệu đã lưu theo khoảng thời gian (epoch giây), dpid và cổng
+    if store is None:
+        return {'error': 'Sample persistence is disabled'}, 404
+    parts = store.query(request.args.get('from', type=float), request.args.get('to', type=float),
+                        request.args.get('dpid'), request.args.get('port'))
+    return {'segments': [{
+        'columns': part['columns'],
+        'time': part['timestamp'].tolist(),
+        'status': [STATUSES[code] for code in part['status']],
+        'vector': part['vector'].tolist(),
+        'p_normal': part['p_normal'].tolist(),
+    } for part in parts]}
 
-        if not sampling_enabled.is_set():
+@app.route('/sampling_stream')
+def sampling_stream():
+    # Server-Sent Events: đẩy từng dòng mới ngay khi có trạng thái
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        latest = snapshot_reader.refresh().published_seq if ROLE == 'api' else published_seq
+        since = request.args.get('since', latest, type=int)
+    else:
+        since += 1
+
+    def wait_new_rows(since):
+        if ROLE == 'api':
+            # Snapshot nằm ở tiến trình khác: kiểm tra thay đổi của file theo chu kỳ
+            deadline = time.time() + 15
+            while snapshot_reader.refresh().published_seq <= since and time.time() < deadline:
+                time.sleep(T_SAMPLING / 2)
+            return
+        with new_rows:
+            new_rows.wait_for(lambda: published_seq > since, timeout=15)
+
+    def stream(since):
+        while True:
+            wait_new_rows(since)
+            rows, end = rows_since(since)
+            if not rows:
+                yield ": keepalive\n\n"
+            for row, seq in zip(rows, range(end - len(rows), end)):
+                yield f"id: {seq}\ndata: {row}\n\n"
+            since = end
+
+    return Response(stream_with_context(stream(since)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+def fetch_port_stats(dpid):
+    with REQUEST_SECONDS.time(route='portstats'):
+        data = controllers.controller_for(dpid).post(f"/portstats/{dpid}", {"dpid": int(dpid)}, ROUND_DEADLINE)
+    return data.get("port_stats", [])
+
+def fetch_port_stats_batch(dpids):
+    # Một yêu cầu batch cho mỗi controller, gửi song song
+    with REQUEST_SECONDS.time(route='portstats_batch'):
+        stats, missing = controllers.fetch_batch("/portstats", "port_stats", dpids, ROUND_DEADLINE, stats_pool)
+    for dpid in missing:
+        SWITCH_MISSED.inc()
+        log.warning(f"Switch {dpid} missed the round deadline")
+    return stats
+
+def fetch_flow_stats_batch(dpids):
+    with REQUEST_SECONDS.time(route='flowstats_batch'):
+        stats, _ = controllers.fetch_batch("/flowstats", "flow_stats", dpids, ROUND_DEADLINE, stats_pool)
+    return stats
+
+def poll_flow_features(dpids, received):
+    # Đặc trưng flow tổng hợp của mỗi switch, tính từ flow stats có match dạng cấu trúc
+    features = {}
+    try:
+        flow_stats = fetch_flow_stats_batch(dpids)
+    except Exception as e:
+        log.error(f"Batch flow stats request failed: {e}")
+        return features
+    for dpid, flows in flow_stats.items():
+        records = [flow_record(f.get("table_id", 0), f.get("priority", 0), f.get("match", {}),
+                               f.get("packet_count", 0), f.get("byte_count", 0),
+                               port_duration(f, received)) for f in flows]
+        features.update(flow_features.update(dpid, records, received))
+    return features
+
+def poll_port_stats(dpids):
+    if USE_BATCH_STATS:
+        try:
+            return fetch_port_stats_batch(dpids)
+        except Exception as e:
+            log.error(f"Batch port stats request failed: {e}")
+            return {}
+
+    # Gửi yêu cầu tới tất cả switch cùng lúc, chờ tối đa ROUND_DEADLINE
+    futures = {stats_pool.submit(fetch_port_stats, dpid): dpid for dpid in dpids}
+    done, not_done = wait(futures, timeout=ROUND_DEADLINE)
+
+    results = {}
+    for future in done:
+        dpid = futures[future]
+        try:
+            results[dpid] = future.result()
+        except Exception as e:
+            SWITCH_MISSED.inc()
+            log.error(f"Collecting stats for DPID {dpid}: {e}")
+    for future in not_done:
+        future.cancel()
+        SWITCH_MISSED.inc()
+        log.warning(f"Switch {futures[future]} missed the round deadline")
+    return results
+
+def poll_deltas():
+    # Chế độ pull: lấy portstats qua REST của Ryu rồi tính tốc độ mỗi giây tại đây
+    current_features = {}
+    deltas = {}
+
+    dpids = current_dpids()
+    received = time.time()
+    if scheduler is not None:
+        dpids = scheduler.due(dpids, received)
+        if not dpids:
+            return deltas
+    flows_future = stats_pool.submit(poll_flow_features, dpids, received) if flow_features is not None else None
+    port_stats = poll_port_stats(dpids)
+
+    for dpid in dpids:
+        if dpid not in port_stats:
             continue
+        for port in port_stats[dpid]:
+            port_no = port.get("port_no")
+            if port_no == 4294967294:
+                continue
+            key = f"{dpid}-{port_no}"
 
-        if sampling_start_time is None:
-            sampling_start_time = time.time()
+            stats = [
+                port.get("rx_packets", 0),
+                port.get("tx_packets", 0),
+                port.get("rx_bytes", 0),
+                port.get("tx_bytes", 0)
+            ]
 
-        current_features = {}
-        all_deltas = []
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            duration = port_duration(port, received)
+            current_features[key] = (stats, duration)
 
-        for dpid in list(connected_dpids):
-            try:
-                url = f"{BASE_URL}/portstats/{dpid}"
-                res = requests.post(url, json={"dpid": int(dpid)}, timeout=1)
-                if res.status_code == 200:
-                    data = res.json()
-                    for port in data.get("port_stats", []):
-                        port_no = port.get("port_no")
-                        if port_no == 4294967294:
-                            continue
-                        key = f"{dpid}-{port_no}"
-
-                        stats = [
-                            port.get("rx_packets", 0),
-                            port.get("tx_packets", 0),
-                            port.get("rx_bytes", 0),
-                            port.get("tx_bytes", 0)
-                        ]
-
-                        current_features[key] = stats
-
-                        prev = prev_features.get(key, [0, 0, 0, 0])
-                        delta = [curr - p for curr, p in zip(stats, prev)]
-                        all_deltas.extend(delta)
+            # Cổng mới xuất hiện lần đầu có tốc độ 0 thay vì toàn bộ bộ đếm tích lũy
+            deltas[key] = counter_rates(stats, duration, prev_features.get(key))
+
+    # Switch lỡ hạn chót vẫn giữ bộ đếm cũ để vòng sau tính tốc độ đúng
+    prev_features.update(current_features)
+    if flows_future is not None:
+        try:
+            deltas.update(flows_future.result(timeout=ROUND_DEADLINE + 0.5))
+        except Exception as e:
+            log.warning(f"Flow features missed the round deadline: {e}")
+    return deltas
+
+def impute_values(model, columns):
+    # Giá trị điền cho cột không có dữ liệu trong tick (switch lỡ hạn chót, switch chết,
+    # cổng bị xóa): trung bình huấn luyện của mô hình, tức điểm chuẩn hóa 0, không tự
+    # gây warning; chưa có mô hình thì điền 0
+    global _impute_cache
+    cached_model, cached_columns, fill = _impute_cache
+    if cached_model is model and cached_columns is columns:
+        return fill
+    fill = np.zeros((len(columns), PORT_FEATURES))
+    if model is not None:
+        mean = model.scaler.mean_
+        if FEATURE_MODE == 'port':
+            fill[:] = mean
+        else:
+            fill[:len(model.columns)] = mean.reshape(len(model.columns), PORT_FEATURES)
+    _impute_cache = (model, columns, fill)
+    return fill
+
+def process_sample(deltas, now):
+    global samples, samples_since_refit, layout_ticks
+    current_time = datetime.datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+
+    # Lược đồ cột ổn định: cổng mới nối vào cuối và lịch sử được chép sang bộ đệm mới,
+    # mô hình hiện tại chấm tiếp trên các cột cũ thay vì huấn luyện lại từ đầu
+    topology.extend(deltas)
+    columns = topology.columns
+    if samples is None:
+        samples = RingBuffer(MAX_SAMPLES, PORT_FEATURES * len(columns), columns,
+                             n_flags=len(columns) if FEATURE_MODE == 'port' else 0)
+    elif len(samples.columns) != len(columns):
+        samples = samples.remap(columns, PORT_FEATURES)
+        layout_ticks = 0
+        log.info(f"Feature layout grew to {len(columns)} columns")
+    layout_ticks += 1
+
+    model = detector
+    if model is not None and not model_compatible(model, samples.columns):
+        # Mô hình hiện tại không khớp bố cục cột: huấn luyện lại trên bố cục mới
+        model = None
+    all_deltas = impute_values(model, samples.columns).copy()
+    for key, values in deltas.items():
+        all_deltas[topology.index[key]] = values
+    all_deltas = all_deltas.ravel()
+
+    row = samples.append(all_deltas, now)
+    elapsed_time = now - sampling_start_time
+    flags = None
+    p_normal = np.full(len(samples.columns) if FEATURE_MODE == 'port' else 1, np.nan)
+    urgency = None  # (cột, điểm bất thường từng cột) cho lịch thăm dò
 
+    # Log có lấy mẫu: vector đầy đủ chỉ ở mức DEBUG và mỗi LOG_EVERY tick
+    log_tick = samples.seq % LOG_EVERY == 0
+    if log_tick and log.isEnabledFor(logging.DEBUG):
+        log.debug(f"Sample {samples.seq} at {current_time} ({len(all_deltas)} features): {all_deltas.tolist()}")
+
+    if (elapsed_time < DURATION_TRAIN or model is None) and len(samples) >= 20:
+        # Chuẩn hóa và huấn luyện GMM ở nền trên bản chụp dữ liệu
+        X = training_matrix(samples)
+        if np.any(np.isnan(X)) or np.any(np.isinf(X)):
+            log.error(f"Invalid values in {int(np.sum(~np.isfinite(X)))} training features")
+            status = "error"
+        else:
+            submit_training(samples)
+            status = "train"
+    elif elapsed_time >= DURATION_TRAIN and model is not None:
+        # Chuẩn hóa mẫu mới và dự đoán
+        X = samples.data[row] if FEATURE_MODE == 'port' else samples.data[row, :model.n_features]
+        X = X.reshape(-1, PORT_FEATURES if FEATURE_MODE == 'port' else model.n_features)
+        if np.any(np.isnan(X)) or np.any(np.isinf(X)):
+            status = "error"
+            log.error(f"Invalid values in {int(np.sum(~np.isfinite(X)))} features of sample {samples.seq}")
+        else:
+            try:
+                scoring_started = time.perf_counter()
+                if FEATURE_MODE == 'port':
+                    # Quyết định theo tick: ngưỡng hiệu chỉnh trên cổng kém nhất của mỗi tick
+                    # huấn luyện, không phải ngưỡng từng cổng nhân lên theo số cổng
+                    flags, p_normal = model.predict_ports(X)
+                    status = "warning" if flags.any() else "normal"
                 else:
-                    print(f"[WARN] Cannot get port stats from switch {dpid}")
+                    port_status, probs = model.predict_many(X)
+                    status = str(port_status[0])
+                    p_normal = model.p_normal(probs)
+                if scheduler is not None:
+                    if FEATURE_MODE == 'port':
+                        urgency = (samples.columns, 1 - p_normal)
+                    else:
+                        # Tick warning: chỉ switch có cột lệch mạnh mới được thăm dò dày hơn, không phải mọi switch
+                        z = column_z(model.scaler, X[0], len(model.columns), PORT_FEATURES)
+                        urgency = (model.columns, float(status == "warning") * (z > MITIGATION_Z))
+
+                if mitigation is not None and status == "warning":
+                    # Phản ứng ngay trong tick: cổng bị gắn cờ (port) hoặc cột lệch mạnh (global)
+                    if FEATURE_MODE == 'port':
+                        targets = [samples.columns[j] for j in np.flatnonzero(flags)]
+                    else:
+                        targets = offending_columns(model.scaler, X[0], model.columns, PORT_FEATURES, MITIGATION_Z)
+                    if targets:
+                        mitigation.submit(targets, now)
+
+                # Cập nhật mô hình: gộp mẫu mới (online) hoặc huấn luyện lại ở nền với MAX_SAMPLES gần nhất
+                samples_since_refit += 1
+                # Mô hình chỉ phủ các cột cũ: huấn luyện lại khi cổng mới đã có đủ dữ liệu
+                remap_refit = (FEATURE_MODE != 'port' and len(model.columns) < len(samples.columns)
+                               and layout_ticks == REMAP_REFIT_AFTER)
+                if UPDATE_MODE == 'refit' or remap_refit or (REFIT_EVERY and samples_since_refit >= REFIT_EVERY):
+                    submit_training(samples)
+                    samples_since_refit = 0
+                if UPDATE_MODE == 'online' and status == "normal":
+                    # Chỉ gộp tick normal: mô hình theo độ trôi của lưu lượng, không học luôn cuộc tấn công
+                    model.partial_fit(X)
+                SCORE_SECONDS.observe(time.perf_counter() - scoring_started)
+                if status == "warning" or log_tick:
+                    log.info(f"[PREDICT] {current_time} - sample {samples.seq} - Status: {status} - "
+                             f"p_normal: {np.round(p_normal, 4).tolist() if FEATURE_MODE != 'port' else float(p_normal.min())}")
             except Exception as e:
-                print(f"[ERROR] Collecting stats for DPID {dpid}: {e}")
+                status = "error"
+                log.error(f"GMM prediction/update failed: {e}")
+    else:
+        status = "collecting"
+        if log_tick:
+            log.info(f"[COLLECT] {current_time} - sample {samples.seq}")
 
-        if all_deltas:
-            feature_vectors.append(all_deltas)
-            elapsed_time = time.time() - sampling_start_time
+    samples.set_status(row, status, flags)
+    STATUS_TOTAL.inc(status=status)
+    if urgency is not None and status in ('normal', 'warning'):
+        scheduler.report(*urgency)
+    controller_status = None
+    if controller_detectors is not None:
+        # Mô hình riêng từng controller trên đúng các cột của nó
+        controller_status = controller_detectors.update(samples, row, controllers.partition(samples.columns),
+                                                        elapsed_time >= DURATION_TRAIN)
+    publish_row(samples, row, samples.seq - 1, controller_status)
+    if store is not None:
+        persist_row(samples, row, p_normal)
 
-            print(f"[DEBUG] Collected sample {len(feature_vectors)} with {len(all_deltas)} features at {current_time}")
+def selection_data(source):
+    # Dữ liệu theo thứ tự thời gian cho việc chọn mô hình, cùng bố cục cột với bộ đệm hiện tại
+    ring = samples
+    if ring is None:
+        return None, None
+    if source == 'store' and store is not None:
+        history = store.tail(SELECT_SAMPLES)
+        if history is not None and history['columns'] == ring.columns:
+            return history['vector'], ring.columns
+        log.warning("Stored samples do not match the current column layout, using the buffer")
+    return ring.ordered().copy(), ring.columns
 
-            if elapsed_time < DURATION_TRAIN and len(feature_vectors) >= 20:
-                try:
-                    # Chuẩn hóa và huấn luyện GMM
-                    X = np.array(feature_vectors)
-                    if np.any(np.isnan(X)) or np.any(np.isinf(X)):
-                        print(f"[ERROR] Invalid values in feature vectors: {X}")
-                        status = "error"
-                    else:
-                        scaler = StandardScaler()
-                        X_scaled = scaler.fit_transform(X)
-                        gmm_model = GaussianMixture(
-                            n_components=3,
-                            random_state=42,
-                            reg_covar=1e-4
-                        )
-                        gmm_model.fit(X_scaled)
-                        # Xác định thành phần normal
-                        probs = gmm_model.predict_proba(X_scaled)
-                        mean_probs = np.mean(probs, axis=0)
-                        normal_component = np.argmax(mean_probs)
-                        status = "train"
-                        print(f"[TRAIN] GMM trained at {current_time} with {len(feature_vectors)} samples, {X.shape[1]} features, normal_component={normal_component}")
-                except Exception as e:
-                    status = "error"
-                    print(f"[ERROR] GMM training failed: {e}")
-            elif elapsed_time >= DURATION_TRAIN and gmm_model is not None and scaler is not None:
-                # Chuẩn hóa mẫu mới và dự đoán
-                X = np.array([all_deltas])
-                if np.any(np.isnan(X)) or np.any(np.isinf(X)):
-                    status = "error"
-                    print(f"[ERROR] Invalid values in feature vector: {X}")
-                else:
-                    try:
-                        X_scaled = scaler.transform(X)
-                        # Dự đoán và lấy xác suất
-                        prediction = gmm_model.predict(X_scaled)[0]
-                        probs = gmm_model.predict_proba(X_scaled)[0]
-                        status = "normal" if prediction == normal_component else "warning"
-                        
-                        # Cập nhật scaler và GMM với MAX_SAMPLES gần nhất
-                        feature_vectors_updated = np.array(feature_vectors[-MAX_SAMPLES:] + [all_deltas])
-                        scaler = StandardScaler()
-                        X_scaled_updated = scaler.fit_transform(feature_vectors_updated)
-                        gmm_model.fit(X_scaled_updated)
-                        # Cập nhật lại normal_component
-                        probs_updated = gmm_model.predict_proba(X_scaled_updated)
-                        mean_probs_updated = np.mean(probs_updated, axis=0)
-                        normal_component = np.argmax(mean_probs_updated)
-                        print(f"[PREDICT] {current_time} - Vector: {all_deltas} - Status: {status} - Probs: {probs} - normal_component={normal_component}")
-                    except Exception as e:
-                        status = "error"
-                        print(f"[ERROR] GMM prediction/update failed: {e}")
+def run_model_selection(criterion=SELECT_CRITERION, source='buffer'):
+    if not selection_lock.acquire(blocking=False):
+        return
+    try:
+        X, columns = selection_data(source)
+        if X is None or len(X) < 20:
+            log.warning("Not enough samples for model selection")
+            return
+        rows_per_tick = 1
+        if FEATURE_MODE == 'port':
+            rows_per_tick = len(columns)
+            X = X.reshape(-1, PORT_FEATURES)
+        base_params = {k: v for k, v in trainer.params.items()
+                       if k not in ('n_components', 'covariance_type', 'reg_covar')}
+        started = time.time()
+        model, params, results = select_model(X, columns, base_params, criterion=criterion,
+                                              workers=SELECT_WORKERS, rows_per_tick=rows_per_tick)
+        ranked = sorted((r for r in results if r.get('params')), key=lambda r: r[criterion],
+                        reverse=criterion == 'heldout')
+        for r in ranked[:5]:
+            p = r['params']
+            log.info(f"[SELECT] k={p['n_components']} cov={p['covariance_type']} reg={p['reg_covar']:g} "
+                     f"heldout={r['heldout']:.3f} bic={r['bic']:.1f} fit={r['fit_time']:.2f}s")
+        if model is None:
+            log.warning(f"Model selection found no candidate within the budget ({len(results)} evaluated)")
+            return
+        # Các lần huấn luyện lại sau dùng siêu tham số vừa chọn; mô hình mới thay vào một lần
+        trainer.params.update(params)
+        install_detector(model)
+        log.info(f"[SELECT] Promoted k={params['n_components']} cov={params['covariance_type']} "
+                 f"reg={params['reg_covar']:g} by {criterion} after {time.time() - started:.1f}s "
+                 f"({len(results)} candidates)")
+    except Exception as e:
+        log.error(f"Model selection failed: {e}")
+    finally:
+        selection_lock.release()
+
+def periodic_model_selection():
+    while True:
+        time.sleep(SELECT_EVERY)
+        if detector is not None:
+            run_model_selection()
+
+def collect_port_stats():
+    global sampling_start_time
+    next_tick = time.monotonic()
+    while True:
+        if COLLECT_MODE in ('push', 'sharded'):
+            # Delta đã được tính ở nơi khác (Ryu hoặc các shard), nhận từng lô qua hàng đợi
+            deltas, now = sample_queue.get()
+            if not sample_queue.empty():
+                # Mẫu mới tới trước khi xử lý xong mẫu trước: tick bị trễ
+                TICK_OVERRUNS.inc()
+        else:
+            # Giữ nhịp lấy mẫu cố định, không cộng dồn thời gian của vòng trước
+            next_tick += T_SAMPLING
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
             else:
-                status = "collecting"
-                print(f"[COLLECT] {current_time} - Vector: {all_deltas}")
+                TICK_OVERRUNS.inc()
+                next_tick = time.monotonic()
 
-            predictions.append({
-                'time': current_time,
-                'vector': all_deltas,
-                'status': status
-            })
+        if not sampling_enabled.is_set():
+            continue
 
-            # Giới hạn số mẫu lưu trữ
-            if len(predictions) > MAX_SAMPLES:
-                predictions.pop(0)
-            if len(feature_vectors) > MAX_SAMPLES:
-                feature_vectors.pop(0)
+        if sampling_start_time is None:
+            sampling_start_time = time.time()
 
-        prev_features = current_features.copy()
+        if COLLECT_MODE == 'pull':
+            with ROUND_SECONDS.time():
+                deltas, now = poll_deltas(), time.time()
 
-if __name__ == '__main__':
+        if not use_flow_features:
+            deltas = {key: v for key, v in deltas.items() if not is_flow_column(key)}
+
+        if scheduler is not None:
+            # Switch chưa tới lượt thăm dò giữ tốc độ đo lần trước
+            scheduler.observe(deltas)
+            deltas = scheduler.fill()
+
+        if deltas:
+            with TICK_SECONDS.time():
+                process_sample(deltas, now)
+
+def start_collector():
+    # Chỉ một tiến trình giữ khóa collector mới được lấy mẫu, tránh thu thập trùng lặp
+    # (ví dụ khi reloader của chế độ debug chạy thêm một tiến trình)
+    global collector_lock, sharder
+    collector_lock = acquire_singleton(COLLECTOR_LOCK)
+    if collector_lock is None:
+        log.warning("Another collector is already running, not starting sampling here")
+        return False
+    if MODEL_DIR:
+        load_checkpoint()
+    if store is not None:
+        warm_start()
+    if COLLECT_MODE == 'sharded':
+        sharder = ShardedCollector(N_SHARDS, BASE_URL, T_SAMPLING, ROUND_DEADLINE, MERGE_GRACE, enqueue_sample)
+        sharder.start()
+        sharder.assign(current_dpids(), controllers.url_for)
+    if push_merger is not None:
+        threading.Thread(target=flush_push_merger, name='push-merger', daemon=True).start()
     threading.Thread(target=collect_port_stats, daemon=True).start()
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    if SELECT_EVERY:
+        threading.Thread(target=periodic_model_selection, name='model-selection', daemon=True).start()
+    write_snapshot()
+    return True
+
+if __name__ == '__main__':
+    # Chế độ phát triển: python app.py [--debug]; chế độ production: python serve.py
+    debug = '--debug' in sys.argv
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_collector()
+    app.run(host='0.0.0.0', port=5000, debug=debug, threaded=True)
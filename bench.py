@@ -0,0 +1,324 @@
+import argparse
+import json
+import logging
+import threading
+import time
+import tracemalloc
+import resource
+import sys
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+from detector import PROJECTION_DIM
+from fleet import ControllerPool, DEFAULT_CONTROLLER
+from ringBuffer import RingBuffer, STATUSES
+from topology import TopologyRegistry
+from trainer import train_detector
+
+# Benchmark không cần Mininet/OVS/root: nguồn stats giả lập hàng trăm tới hàng nghìn
+# switch với các pha normal/warning giống client_behavior của test.py, đo
+#   - độ trễ một vòng thu thập qua HTTP (poll_deltas của app với một Ryu REST giả),
+#   - thời gian huấn luyện và xử lý mỗi tick qua process_sample của app,
+#   - bộ nhớ đỉnh, độ trễ phát hiện, tỉ lệ báo động giả.
+# Ví dụ: python bench.py --switches 100,500,1000 --output bench_output.txt
+
+PORT_FEATURES = 4
+# Hiệp phương sai mặc định theo chế độ: vector toàn cục rộng và ít tick huấn luyện
+# không đủ để ước lượng hiệp phương sai đầy đủ
+COVARIANCE_TYPES = {'port': 'full', 'global': 'diag'}
+
+
+class FakeStatsSource(object):
+    # Bộ đếm cổng (rx/tx packets, rx/tx bytes) của S switch x P cổng, tăng theo tốc độ ngẫu nhiên.
+    #   normal: 3/4 cổng hoạt động, gói 64-512 byte, 100-500 Kbit/s (như client_behavior 'normal')
+    #   warning: các cổng bị tấn công chạy liên tục, gói 4096-16384 byte, 10-50 Mbit/s
+
+    def __init__(self, n_switches, n_ports, attacked_fraction=0.1, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.n_switches = n_switches
+        self.n_ports = n_ports
+        self.counters = np.zeros((n_switches, n_ports, PORT_FEATURES))
+        self.rates = np.zeros((n_switches, n_ports, PORT_FEATURES))
+        self.duration = np.zeros(n_switches)
+        self.attacked = np.zeros((n_switches, n_ports), dtype=bool)
+        n_attacked = max(1, int(round(attacked_fraction * n_switches)))
+        self.attacked[self.rng.choice(n_switches, n_attacked, replace=False), 0] = True
+        self.mode = 'normal'
+        self._lock = threading.Lock()
+
+    def advance(self, dt):
+        shape = (self.n_switches, self.n_ports)
+        active = self.rng.random(shape) < 0.75
+        size = self.rng.integers(64, 513, shape).astype(float)
+        bandwidth = self.rng.integers(100, 501, shape) * 1000 / 8
+        if self.mode == 'warning':
+            hit = self.attacked
+            active = active | hit
+            size[hit] = self.rng.integers(4096, 16385, hit.sum())
+            bandwidth[hit] = self.rng.integers(10000, 50001, hit.sum()) * 1000 / 8
+        tx_bytes = bandwidth * active
+        rx_bytes = tx_bytes * self.rng.uniform(0.9, 1.1, shape)
+        with self._lock:
+            self.rates = np.stack([rx_bytes / size, tx_bytes / size, rx_bytes, tx_bytes], axis=-1)
+            self.counters += self.rates * dt
+            self.duration += dt
+
+    def vector(self):
+        # Vector đặc trưng của tick theo thứ tự cột "dpid-port" (dpid từ 1, cổng từ 1)
+        return self.rates.reshape(-1).copy()
+
+    def columns(self):
+        return [f"{s + 1}-{p + 1}" for s in range(self.n_switches) for p in range(self.n_ports)]
+
+    def port_stats(self, dpid):
+        # Phản hồi portstats giống REST của Ryu cho một switch
+        with self._lock:
+            counters = self.counters[dpid - 1].astype(np.int64)
+            duration = self.duration[dpid - 1]
+        sec = int(duration)
+        nsec = int((duration - sec) * 1e9)
+        return [{'port_no': p + 1, 'rx_packets': int(c[0]), 'tx_packets': int(c[1]),
+                 'rx_bytes': int(c[2]), 'tx_bytes': int(c[3]), 'rx_errors': 0, 'tx_errors': 0,
+                 'collisions': 0, 'duration_sec': sec, 'duration_nsec': nsec}
+                for p, c in enumerate(counters)]
+
+
+class FakeRyuServer(object):
+    # Thay cho REST của Ryu: POST /portstats (batch) và /portstats/<dpid>, bộ đếm
+    # tăng theo thời gian thực giữa các yêu cầu
+
+    def __init__(self, source):
+        self.source = source
+        self.last = time.time()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                server.tick()
+                n = server.source.n_switches
+                if self.path == '/portstats':
+                    dpids = body.get('dpids', 'all')
+                    dpids = range(1, n + 1) if dpids == 'all' else [int(d) for d in dpids]
+                    data = {'port_stats': {d: server.source.port_stats(d) for d in dpids if 1 <= d <= n},
+                            'missing': [d for d in dpids if not 1 <= d <= n]}
+                elif self.path.startswith('/portstats/'):
+                    dpid = int(self.path.rsplit('/', 1)[1])
+                    data = {'dpid': dpid, 'port_stats': server.source.port_stats(dpid)}
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                payload = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def tick(self):
+        now = time.time()
+        with self.source._lock:
+            dt, self.last = now - self.last, now
+        self.source.advance(dt)
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return float('nan'), float('nan')
+    return float(np.percentile(values, 50)), float(np.percentile(values, 95))
+
+
+def bench_collection(n_switches, args):
+    # Vòng thu thập thật của app (HTTP + JSON + tính tốc độ) với Ryu REST giả
+    import app
+    source = FakeStatsSource(n_switches, args.ports, seed=args.seed)
+    with FakeRyuServer(source) as server:
+        app.controllers = ControllerPool({DEFAULT_CONTROLLER: server.url}, app.STATS_WORKERS)
+        app.USE_BATCH_STATS = not args.fanout
+        app.scheduler = None
+        app.flow_features = None
+        app.prev_features.clear()
+        with app.dpids_lock:
+            app.connected_dpids.clear()
+            app.connected_dpids.update(str(d) for d in range(1, n_switches + 1))
+        latencies, missed = [], 0
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            deltas = app.poll_deltas()
+            latencies.append(time.perf_counter() - started)
+            missed += n_switches * args.ports - len(deltas)
+            time.sleep(max(0, app.T_SAMPLING - latencies[-1]))
+    return {'round_p50_ms': 1000 * percentiles(latencies)[0], 'round_p95_ms': 1000 * percentiles(latencies)[1],
+            'missed_ports': missed}
+
+
+def setup_app(args):
+    # Trạng thái sạch của app cho một lần đo: không ghi đĩa, không gửi rule, không
+    # huấn luyện lại định kỳ ở nền (kết quả không phụ thuộc luồng trainer)
+    import app
+    app.FEATURE_MODE = args.feature_mode
+    app.MAX_SAMPLES = args.max_samples
+    app.MODEL_DIR = None
+    app.REFIT_EVERY = 0
+    for name in ('store', 'scheduler', 'mitigation', 'controller_detectors', 'samples', 'detector'):
+        setattr(app, name, None)
+    app.topology = TopologyRegistry()
+    app.row_cache.clear()
+    logging.getLogger('sdn').setLevel(logging.WARNING)
+    return app
+
+
+def bench_pipeline(n_switches, args):
+    # Huấn luyện rồi chạy đúng đường xử lý mỗi tick của app (process_sample: điền bù,
+    # chấm điểm, cập nhật online, công bố dòng) qua các pha normal -> warning -> normal.
+    # Đo được với tham số mặc định (40 tick huấn luyện, seed 0-2, 10-1000 switch):
+    #   port + full:   recall 1.00, độ trễ 0 tick, báo động giả 0-0.15
+    #   global + diag: recall 1.00, độ trễ 0 tick, báo động giả 0-0.15
+    #   global + full: recall 0 từ 100 switch (vector được chiếu, 40 tick quá ít để ước
+    #                  lượng hiệp phương sai đầy đủ); cần >= 100 tick huấn luyện
+    # main() kiểm tra recall/báo động giả của mọi dòng theo --min-recall/--max-fpr.
+    app = setup_app(args)
+    source = FakeStatsSource(n_switches, args.ports, args.attacked, seed=args.seed)
+    columns = source.columns()
+    width = len(columns) * PORT_FEATURES
+    app.trainer.params.update(covariance_type=args.covariance_type, projection=None)
+    if args.feature_mode != 'port' and width > args.projection_threshold:
+        app.trainer.params.update(projection=args.projection, projection_dim=PROJECTION_DIM)
+
+    tracemalloc.start()
+    # Dữ liệu huấn luyện nạp như warm_start, mô hình được huấn luyện đồng bộ rồi cài như trainer
+    app.topology.extend(columns)
+    app.samples = RingBuffer(args.max_samples, width, columns,
+                             n_flags=len(columns) if args.feature_mode == 'port' else 0)
+    now = time.time()
+    for _ in range(args.train_ticks):
+        source.advance(args.tick)
+        now += args.tick
+        app.samples.append(source.vector(), now)
+    started = time.perf_counter()
+    model = train_detector(app.training_matrix(app.samples), app.samples.columns, app.trainer.params,
+                           app.rows_per_tick(app.samples))
+    train_time = time.perf_counter() - started
+    app.install_detector(model)
+    app.sampling_start_time = now - app.DURATION_TRAIN
+
+    phases = [('normal', args.normal_ticks), ('warning', args.warning_ticks), ('normal', args.normal_ticks)]
+    score_times, verdicts = [], []
+    for mode, n_ticks in phases:
+        source.mode = mode
+        for _ in range(n_ticks):
+            source.advance(args.tick)
+            now += args.tick
+            deltas = dict(zip(columns, source.rates.reshape(-1, PORT_FEATURES).tolist()))
+            started = time.perf_counter()
+            app.process_sample(deltas, now)
+            score_times.append(time.perf_counter() - started)
+            row = (app.samples.head - 1) % app.samples.capacity
+            verdicts.append((mode, STATUSES[app.samples.status[row]] == 'warning'))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    onset = args.normal_ticks
+    detected = [i for i in range(onset, onset + args.warning_ticks) if verdicts[i][1]]
+    normal_flags = [w for mode, w in verdicts if mode == 'normal']
+    delay = detected[0] - onset if detected else None
+    return {
+        'features': width,
+        'train_s': train_time,
+        'score_p50_ms': 1000 * percentiles(score_times)[0],
+        'score_p95_ms': 1000 * percentiles(score_times)[1],
+        'peak_mb': peak / 2 ** 20,
+        'delay_ticks': delay,
+        'delay_s': delay * args.tick if delay is not None else None,
+        'recall': len(detected) / max(args.warning_ticks, 1),
+        'false_positive_rate': sum(normal_flags) / max(len(normal_flags), 1),
+    }
+
+
+def format_row(n_switches, result):
+    def fmt(key, spec):
+        value = result.get(key)
+        return 'n/a' if value is None else format(value, spec)
+    return (f"{n_switches:>8} {fmt('features', 'd'):>8} {fmt('round_p50_ms', '.1f'):>9} {fmt('round_p95_ms', '.1f'):>9} "
+            f"{fmt('missed_ports', 'd'):>6} {fmt('train_s', '.3f'):>8} {fmt('score_p50_ms', '.2f'):>9} "
+            f"{fmt('score_p95_ms', '.2f'):>9} {fmt('peak_mb', '.1f'):>8} {fmt('delay_ticks', 'd'):>6} "
+            f"{fmt('recall', '.2f'):>6} {fmt('false_positive_rate', '.3f'):>6}")
+
+
+HEADER = (f"{'switches':>8} {'features':>8} {'round50':>9} {'round95':>9} {'missed':>6} {'train_s':>8} "
+          f"{'score50':>9} {'score95':>9} {'peak_mb':>8} {'delay':>6} {'recall':>6} {'fpr':>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark collection and detection with simulated switches")
+    parser.add_argument('--switches', default='100,500,1000', help="Comma-separated switch counts")
+    parser.add_argument('--ports', type=int, default=4, help="Ports per switch")
+    parser.add_argument('--attacked', type=float, default=0.1, help="Fraction of switches under attack")
+    parser.add_argument('--tick', type=float, default=0.5, help="Simulated sampling interval (s)")
+    parser.add_argument('--train-ticks', type=int, default=40)
+    parser.add_argument('--normal-ticks', type=int, default=60)
+    parser.add_argument('--warning-ticks', type=int, default=30)
+    parser.add_argument('--max-samples', type=int, default=200)
+    parser.add_argument('--feature-mode', choices=['global', 'port', 'both'], default='both')
+    parser.add_argument('--covariance-type', choices=['full', 'tied', 'diag', 'spherical'],
+                        help="Default: full in port mode, diag in global mode")
+    parser.add_argument('--projection', default='random', choices=['ipca', 'random'],
+                        help="Projection used in global mode for wide vectors")
+    parser.add_argument('--projection-threshold', type=int, default=256,
+                        help="Project global vectors wider than this")
+    parser.add_argument('--rounds', type=int, default=20, help="HTTP collection rounds per size")
+    parser.add_argument('--fanout', action='store_true', help="Per-switch requests instead of the batch route")
+    parser.add_argument('--skip-http', action='store_true', help="Only benchmark training/scoring")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-recall', type=float, default=0.9, help="Fail when recall is below this")
+    parser.add_argument('--max-fpr', type=float, default=0.2, help="Fail when the false positive rate is above this")
+    parser.add_argument('--output', help="Append the report to this file, e.g. bench_output.txt")
+    args = parser.parse_args()
+
+    lines, failed = [], 0
+    modes = ['port', 'global'] if args.feature_mode == 'both' else [args.feature_mode]
+    for mode in modes:
+        run = argparse.Namespace(**vars(args))
+        run.feature_mode = mode
+        run.covariance_type = args.covariance_type or COVARIANCE_TYPES[mode]
+        lines += [f"# bench {time.strftime('%Y-%m-%d %H:%M:%S')} mode={mode} ports={args.ports} "
+                  f"cov={run.covariance_type} batch={not args.fanout}", HEADER]
+        print('\n'.join(lines[-2:]))
+        for n_switches in [int(n) for n in args.switches.split(',')]:
+            result = bench_pipeline(n_switches, run)
+            # Thu thập qua HTTP không phụ thuộc chế độ đặc trưng, chỉ đo một lần
+            if not args.skip_http and mode == modes[0]:
+                result.update(bench_collection(n_switches, run))
+            lines.append(format_row(n_switches, result))
+            if result['recall'] < args.min_recall or result['false_positive_rate'] > args.max_fpr:
+                failed += 1
+                lines[-1] += f"  FAIL (recall >= {args.min_recall}, fpr <= {args.max_fpr})"
+            print(lines[-1])
+    lines.append(f"# max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    print(lines[-1])
+
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write('\n'.join(lines) + '\n')
+    if failed:
+        sys.exit(f"{failed} benchmark row(s) outside the recall/false positive bounds")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,573 @@
+import os
+import re
+import json
+import time
+import logging
+import numpy as np
+from scipy.linalg import solve_triangular
+from sklearn.mixture import GaussianMixture
+from sklearn.preprocessing import StandardScaler
+from sklearn.decomposition import IncrementalPCA
+
+N_COMPONENTS = 3
+REG_COVAR = 1e-4
+COVARIANCE_TYPE = 'full'  # 'full', 'tied', 'diag' hoặc 'spherical'
+PROJECTION = None   # None, 'ipca' (PCA tăng dần) hoặc 'random' (chiếu ngẫu nhiên Gauss)
+PROJECTION_DIM = 16  # Số chiều sau khi chiếu
+PROJECTION_BATCH = 32  # Số dòng gom lại trước mỗi lần cập nhật IPCA
+STEP_OFFSET = 10    # Độ trễ ban đầu của bước học trong EM trực tuyến
+STEP_DECAY = 0.6    # Tốc độ giảm bước học, nằm trong (0.5, 1]
+FACTOR_EVERY = 10   # Số bước EM trực tuyến giữa hai lần tính lại Cholesky của precision (full, tied)
+SCORE_MODE = 'likelihood'  # 'likelihood': so log-likelihood với ngưỡng, 'component': so với thành phần normal
+THRESHOLD_PERCENTILE = 1.0  # Phân vị log-likelihood của dữ liệu huấn luyện dùng làm ngưỡng
+CALIBRATION_FOLDS = 4  # Số phần chia dữ liệu khi hiệu chỉnh ngưỡng trên log-likelihood ngoài mẫu (mỗi tick một dòng)
+NORMAL_WEIGHT = 0.05  # Chế độ port: thành phần chiếm ít nhất tỉ lệ này dữ liệu huấn luyện được coi là normal
+CHECKPOINT_VERSION = 1  # Tăng khi định dạng file checkpoint thay đổi
+SCORE_CHUNK = 4096  # Số dòng mỗi khối khi chấm điểm hàng loạt
+CHECKPOINT_NAME = re.compile(r'^gmm-(\d{6})\.npz$')  # File tạm "gmm-XXXXXX.npz.tmp.npz" không khớp
+
+log = logging.getLogger('sdn')
+
+
+def score_terms(gmm):
+    # Các đại lượng chỉ phụ thuộc tham số GMM (Cholesky của precision, mean đã chiếu,
+    # log-định thức, log trọng số), tính một lần sau mỗi lần mô hình thay đổi
+    means = gmm.means_
+    prec_chol = gmm.precisions_cholesky_
+    cov_type = gmm.covariance_type
+    d = means.shape[1]
+    terms = {'cov_type': cov_type, 'prec_chol': prec_chol, 'means': means}
+
+    if cov_type == 'full':
+        log_det = np.log(np.diagonal(prec_chol, axis1=1, axis2=2)).sum(axis=1)
+        terms['mean_proj'] = np.einsum('kd,kde->ke', means, prec_chol)
+    elif cov_type == 'tied':
+        log_det = np.full(len(means), np.log(np.diag(prec_chol)).sum())
+        terms['mean_proj'] = means @ prec_chol
+        terms['mean_sq'] = (terms['mean_proj'] ** 2).sum(axis=1)
+    elif cov_type == 'diag':
+        log_det = np.log(prec_chol).sum(axis=1)
+        terms['precisions'] = prec_chol ** 2
+        terms['mean_proj'] = means * terms['precisions']
+        terms['mean_sq'] = (means ** 2 * terms['precisions']).sum(axis=1)
+    else:  # spherical
+        log_det = d * np.log(prec_chol)
+        terms['precisions'] = prec_chol ** 2
+        terms['mean_sq'] = (means ** 2).sum(axis=1)
+
+    terms['const'] = -0.5 * d * np.log(2 * np.pi) + log_det + np.log(gmm.weights_)
+    return terms
+
+
+def weighted_log_prob(gmm, X, terms=None):
+    # log(w_k) + log N(x | mu_k, Sigma_k) cho mọi mẫu và thành phần trong một lượt
+    if terms is None:
+        terms = score_terms(gmm)
+    cov_type = terms['cov_type']
+    prec_chol = terms['prec_chol']
+
+    if cov_type == 'full':
+        Y = np.einsum('nd,kde->kne', X, prec_chol) - terms['mean_proj'][:, None, :]
+        maha = np.einsum('kne,kne->nk', Y, Y)
+    elif cov_type == 'tied':
+        y = X @ prec_chol
+        maha = (y * y).sum(axis=1)[:, None] - 2 * y @ terms['mean_proj'].T + terms['mean_sq']
+    elif cov_type == 'diag':
+        maha = (X * X) @ terms['precisions'].T - 2 * X @ terms['mean_proj'].T + terms['mean_sq']
+    else:  # spherical
+        maha = ((X * X).sum(axis=1)[:, None] - 2 * X @ terms['means'].T + terms['mean_sq']) * terms['precisions']
+
+    return terms['const'] - 0.5 * maha
+
+
+def full_covariances(gmm):
+    # Ma trận hiệp phương sai đầy đủ (k, d, d) cho mọi covariance_type
+    cov = gmm.covariances_
+    k, d = gmm.means_.shape
+    if gmm.covariance_type == 'full':
+        return cov
+    if gmm.covariance_type == 'tied':
+        return np.broadcast_to(cov, (k, d, d)).copy()
+    if gmm.covariance_type == 'diag':
+        return np.einsum('ki,ij->kij', cov, np.eye(d))
+    return cov[:, None, None] * np.eye(d)
+
+
+def precisions_from_cholesky(prec_chol, cov_type):
+    if cov_type == 'full':
+        return np.einsum('kij,klj->kil', prec_chol, prec_chol)
+    if cov_type == 'tied':
+        return prec_chol @ prec_chol.T
+    return prec_chol ** 2
+
+
+def log_normalize(weighted):
+    # logsumexp theo từng dòng, trả về (log-likelihood, log-responsibility)
+    top = weighted.max(axis=1, keepdims=True)
+    log_norm = top + np.log(np.exp(weighted - top).sum(axis=1, keepdims=True))
+    return log_norm[:, 0], weighted - log_norm
+
+
+class OnlineGMM(object):
+    # EM từng bước (stepwise EM) trên thống kê đủ của một GMM đã được huấn luyện,
+    # mỗi mẫu mới tốn O(k·d²) cho phần cập nhật thống kê. Thống kê bậc hai luôn
+    # giữ dạng đầy đủ, covariance_type chỉ quyết định cách suy ra tham số. Phân rã
+    # Cholesky O(k·d³) chỉ được tính lại mỗi FACTOR_EVERY bước.
+
+    def __init__(self, gmm, reg_covar=REG_COVAR, step_offset=STEP_OFFSET, step_decay=STEP_DECAY):
+        self.gmm = gmm
+        self.reg_covar = reg_covar
+        self.step_offset = step_offset
+        self.step_decay = step_decay
+        self.n_updates = 0
+
+        weights = gmm.weights_
+        means = gmm.means_
+        self.s0 = weights.copy()
+        self.s1 = weights[:, None] * means
+        self.s2 = weights[:, None, None] * (full_covariances(gmm) + np.einsum('ki,kj->kij', means, means))
+
+    def partial_fit(self, X):
+        # Một bước EM trên cả lô mẫu (mini-batch), lô một dòng là EM từng mẫu
+        X = np.atleast_2d(X)
+        resp = np.exp(log_normalize(weighted_log_prob(self.gmm, X))[1])
+        eta = (self.n_updates + self.step_offset) ** -self.step_decay
+        self.n_updates += 1
+
+        n = X.shape[0]
+        self.s0 *= 1 - eta
+        self.s0 += eta * resp.mean(axis=0)
+        self.s1 *= 1 - eta
+        self.s1 += eta * (resp.T @ X) / n
+        self.s2 *= 1 - eta
+        self.s2 += eta * np.einsum('nk,ni,nj->kij', resp, X, X) / n
+
+        self._update_params()
+        return self
+
+    def remap(self, A, b, refresh=True):
+        # Biểu diễn lại thống kê sau phép biến đổi affine z' = A z + b (khi cơ sở chiếu
+        # hoặc scaler được cập nhật), không cần huấn luyện lại. A một chiều là ma trận
+        # đường chéo (scaler), chỉ tốn O(k·d²)
+        if A.ndim == 1:
+            s1 = self.s1 * A
+            s2 = self.s2 * np.outer(A, A)
+        else:
+            s1 = self.s1 @ A.T
+            s2 = np.einsum('ij,kjl,ml->kim', A, self.s2, A)
+        self.s2 = (s2 + np.einsum('ki,j->kij', s1, b) + np.einsum('i,kj->kij', b, s1)
+                   + self.s0[:, None, None] * np.outer(b, b))
+        self.s1 = s1 + self.s0[:, None] * b
+        self._update_params(refresh)
+
+    def _update_params(self, refresh=False):
+        gmm = self.gmm
+        s0 = np.maximum(self.s0, 10 * np.finfo(float).eps)
+        weights = s0 / s0.sum()
+        means = self.s1 / s0[:, None]
+        covariances = self.s2 / s0[:, None, None] - np.einsum('ki,kj->kij', means, means)
+        d = means.shape[1]
+
+        # Ma trận precision dạng Cholesky như sklearn dùng khi dự đoán; giữa hai lần
+        # tính lại, weights/means mới dùng precision của lần tính gần nhất
+        cov_type = gmm.covariance_type
+        refresh = refresh or self.n_updates % FACTOR_EVERY == 0
+        prec_chol = None
+        if cov_type == 'full':
+            covariances += self.reg_covar * np.eye(d)
+            if refresh:
+                prec_chol = np.empty_like(covariances)
+                for k, cov in enumerate(covariances):
+                    prec_chol[k] = solve_triangular(np.linalg.cholesky(cov), np.eye(d), lower=True).T
+        elif cov_type == 'tied':
+            covariances = np.einsum('k,kij->ij', weights, covariances) + self.reg_covar * np.eye(d)
+            if refresh:
+                prec_chol = solve_triangular(np.linalg.cholesky(covariances), np.eye(d), lower=True).T
+        elif cov_type == 'diag':
+            covariances = np.diagonal(covariances, axis1=1, axis2=2) + self.reg_covar
+            prec_chol = 1.0 / np.sqrt(covariances)
+        else:  # spherical
+            covariances = np.diagonal(covariances, axis1=1, axis2=2).mean(axis=1) + self.reg_covar
+            prec_chol = 1.0 / np.sqrt(covariances)
+
+        gmm.weights_ = weights
+        gmm.means_ = means
+        gmm.covariances_ = covariances
+        if prec_chol is not None:
+            gmm.precisions_cholesky_ = prec_chol
+            gmm.precisions_ = precisions_from_cholesky(prec_chol, cov_type)
+
+
+class Projection(object):
+    # Giảm chiều giữa StandardScaler và GMM: z = (x - mean) @ components.T
+
+    def __init__(self, kind, n_components, random_state=42, batch_size=PROJECTION_BATCH):
+        self.kind = kind
+        self.n_components = n_components
+        self.random_state = random_state
+        self.batch_size = batch_size
+        self.ipca = None
+        self.mean_ = None
+        self.components_ = None
+        self._pending = []
+
+    def fit(self, X):
+        n, d = X.shape
+        p = min(self.n_components, d) if self.kind == 'random' else min(self.n_components, d, n)
+        if self.kind == 'ipca':
+            self.ipca = IncrementalPCA(n_components=p)
+            self.ipca.fit(X)
+            self.mean_ = self.ipca.mean_.copy()
+            self.components_ = self.ipca.components_.copy()
+        else:
+            # Ma trận Gauss cố định, không phụ thuộc dữ liệu nên không cần cập nhật
+            rng = np.random.RandomState(self.random_state)
+            self.mean_ = np.zeros(d)
+            self.components_ = rng.normal(size=(p, d)) / np.sqrt(p)
+        return self
+
+    def transform(self, X):
+        return (X - self.mean_) @ self.components_.T
+
+    def partial_fit(self, X):
+        # Gom dòng tới đủ lô rồi cập nhật IPCA; trả về (A, b) của phép đổi cơ sở
+        # z_mới = A z_cũ + b, hoặc None nếu cơ sở không đổi
+        if self.kind != 'ipca':
+            return None
+        self._pending.extend(X)
+        if len(self._pending) < max(self.batch_size, self.ipca.n_components_):
+            return None
+        batch, self._pending = np.array(self._pending), []
+        self.ipca.partial_fit(batch)
+
+        old_mean, old_components = self.mean_, self.components_
+        self.mean_ = self.ipca.mean_.copy()
+        self.components_ = self.ipca.components_.copy()
+        A = self.components_ @ old_components.T
+        b = self.components_ @ (old_mean - self.mean_)
+        return A, b
+
+    def arrays(self):
+        arrays = {'proj_mean': self.mean_, 'proj_components': self.components_}
+        if self.ipca is not None:
+            arrays.update({
+                'ipca_components': self.ipca.components_,
+                'ipca_mean': self.ipca.mean_,
+                'ipca_var': self.ipca.var_,
+                'ipca_singular_values': self.ipca.singular_values_,
+                'ipca_explained_variance': self.ipca.explained_variance_,
+                'ipca_n_samples_seen': np.asarray(self.ipca.n_samples_seen_),
+                # Các dòng đã gom nhưng chưa đủ lô cập nhật
+                'ipca_pending': np.array(self._pending, dtype=float).reshape(-1, self.ipca.n_features_in_),
+            })
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, kind, n_components, arrays):
+        proj = cls(kind, n_components)
+        proj.mean_ = arrays['proj_mean']
+        proj.components_ = arrays['proj_components']
+        if kind == 'ipca':
+            # Khôi phục trạng thái IPCA để tiếp tục partial_fit sau khi khởi động lại
+            ipca = proj.ipca = IncrementalPCA(n_components=arrays['ipca_components'].shape[0])
+            ipca.components_ = arrays['ipca_components']
+            ipca.n_components_ = ipca.components_.shape[0]
+            ipca.mean_ = arrays['ipca_mean']
+            ipca.var_ = arrays['ipca_var']
+            ipca.singular_values_ = arrays['ipca_singular_values']
+            ipca.explained_variance_ = arrays['ipca_explained_variance']
+            ipca.n_samples_seen_ = arrays['ipca_n_samples_seen'].item()
+            ipca.n_features_in_ = ipca.mean_.shape[0]
+            proj._pending = list(arrays['ipca_pending']) if 'ipca_pending' in arrays else []
+        return proj
+
+
+class Detector(object):
+    # Bộ scaler + GMM + chỉ số thành phần normal
+
+    def __init__(self, n_components=N_COMPONENTS, reg_covar=REG_COVAR, random_state=42,
+                 score_mode=SCORE_MODE, threshold_percentile=THRESHOLD_PERCENTILE,
+                 covariance_type=COVARIANCE_TYPE, projection=PROJECTION, projection_dim=PROJECTION_DIM):
+        self.n_components = n_components
+        self.reg_covar = reg_covar
+        self.covariance_type = covariance_type
+        self.projection = projection
+        self.projection_dim = projection_dim
+        self.proj = None
+        self.random_state = random_state
+        self.score_mode = score_mode
+        self.threshold_percentile = threshold_percentile
+        self.threshold = None   # Ngưỡng log-likelihood cho chế độ 'likelihood'
+        self.tick_threshold = None  # Ngưỡng trên log-likelihood nhỏ nhất của một tick nhiều dòng (chế độ port)
+        self.normal_components = None  # Chế độ port: mọi thành phần có trọng số huấn luyện đáng kể
+        self._terms = None
+        self.scaler = None
+        self.gmm = None
+        self.online = None
+        self.normal_component = None
+        self.n_features = None
+        self.n_samples = 0
+        self.columns = None     # Thứ tự các khóa dpid-port lúc huấn luyện
+        self.trained_at = None
+        self.metadata = {}
+
+    def fit(self, X, rows_per_tick=1):
+        # rows_per_tick > 1: X gồm các tick liên tiếp, mỗi tick rows_per_tick dòng (cổng)
+        X = np.asarray(X, dtype=float)
+        self.scaler = StandardScaler()
+        X_scaled = self.scaler.fit_transform(X)
+        self.proj = None
+        if self.projection:
+            self.proj = Projection(self.projection, self.projection_dim, self.random_state).fit(X_scaled)
+            X_scaled = self.proj.transform(X_scaled)
+        self.gmm = GaussianMixture(
+            n_components=self.n_components,
+            covariance_type=self.covariance_type,
+            random_state=self.random_state,
+            reg_covar=self.reg_covar
+        )
+        self.gmm.fit(X_scaled)
+        self._terms = None
+        # Thành phần normal là thành phần có xác suất trung bình lớn nhất. Chế độ port còn
+        # coi mọi thành phần có trọng số đáng kể (ví dụ cổng rỗi thành cụm riêng) là normal
+        log_likelihood, log_resp = log_normalize(weighted_log_prob(self.gmm, X_scaled, self.terms))
+        weights = np.mean(np.exp(log_resp), axis=0)
+        self.normal_component = int(np.argmax(weights))
+        self.normal_components = self._normal_set(weights)
+        # Ngưỡng hiệu chỉnh: một tỉ lệ nhỏ dữ liệu huấn luyện nằm dưới ngưỡng
+        if self.score_mode == 'likelihood' and rows_per_tick == 1:
+            # Mỗi tick một vector nhiều chiều: GMM khớp quá sát dữ liệu huấn luyện, tick
+            # normal mới có log-likelihood thấp hơn nhiều nên ngưỡng lấy trên dữ liệu ngoài mẫu
+            log_likelihood = self._heldout_log_likelihood(X_scaled, log_likelihood)
+        self.threshold = float(np.percentile(log_likelihood, self.threshold_percentile))
+        # Với tick nhiều cổng, hiệu chỉnh trên giá trị nhỏ nhất của mỗi tick để tỉ lệ tick
+        # báo động sai giữ ở threshold_percentile bất kể số cổng
+        self.tick_threshold = self.threshold
+        if rows_per_tick > 1 and len(log_likelihood) >= rows_per_tick:
+            n_ticks = len(log_likelihood) // rows_per_tick
+            tick_min = log_likelihood[:n_ticks * rows_per_tick].reshape(n_ticks, rows_per_tick).min(axis=1)
+            self.tick_threshold = float(np.percentile(tick_min, self.threshold_percentile))
+        self.online = OnlineGMM(self.gmm, reg_covar=self.reg_covar)
+        self.n_samples, self.n_features = X.shape
+        self.trained_at = time.time()
+        return self
+
+    def partial_fit(self, X):
+        # Cập nhật scaler theo trung bình/phương sai chạy rồi gộp mẫu vào GMM. Thống kê EM
+        # được biểu diễn lại theo phép đổi tọa độ của scaler để không trộn hai hệ tọa độ;
+        # có phép chiếu thì không đổi được chính xác, scaler giữ nguyên tới lần refit
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        if self.proj is None:
+            old_mean, old_scale = self.scaler.mean_.copy(), self.scaler.scale_.copy()
+            self.scaler.partial_fit(X)
+            self.online.remap(old_scale / self.scaler.scale_,
+                              (old_mean - self.scaler.mean_) / self.scaler.scale_, refresh=False)
+        X_scaled = self.scaler.transform(X)
+        if self.proj is not None:
+            change = self.proj.partial_fit(X_scaled)
+            if change is not None:
+                self.online.remap(*change)
+            X_scaled = self.proj.transform(X_scaled)
+        self.online.partial_fit(X_scaled)
+        self._terms = None
+        self.normal_component = int(np.argmax(self.gmm.weights_))
+        self.normal_components = self._normal_set(self.gmm.weights_)
+        return self
+
+    def _heldout_log_likelihood(self, X_scaled, log_likelihood, folds=CALIBRATION_FOLDS):
+        # Log-likelihood của mỗi phần dữ liệu dưới GMM huấn luyện trên các phần còn lại
+        parts = np.array_split(np.arange(len(X_scaled)), folds)
+        if min(len(X_scaled) - len(part) for part in parts) <= self.n_components:
+            return log_likelihood
+        heldout = np.empty(len(X_scaled))
+        for part in parts:
+            rest = np.ones(len(X_scaled), dtype=bool)
+            rest[part] = False
+            gmm = GaussianMixture(n_components=self.n_components, covariance_type=self.covariance_type,
+                                  random_state=self.random_state, reg_covar=self.reg_covar).fit(X_scaled[rest])
+            heldout[part] = gmm.score_samples(X_scaled[part])
+        return heldout
+
+    def _normal_set(self, weights):
+        normal = np.flatnonzero(weights >= NORMAL_WEIGHT)
+        return normal if len(normal) else np.array([int(np.argmax(weights))])
+
+    def transform(self, X):
+        # Không gian đầu vào của GMM: chuẩn hóa rồi (tùy chọn) giảm chiều
+        X_scaled = self.scaler.transform(X)
+        if self.proj is not None:
+            X_scaled = self.proj.transform(X_scaled)
+        return X_scaled
+
+    @property
+    def terms(self):
+        if self._terms is None:
+            self._terms = score_terms(self.gmm)
+        return self._terms
+
+    def score_batch(self, X, chunk_size=SCORE_CHUNK):
+        # Chấm điểm hàng loạt theo khối, mỗi khối chỉ tính log-likelihood một lần
+        # rồi suy ra cả xác suất thành phần lẫn kết luận normal/warning
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        n = X.shape[0]
+        probs = np.empty((n, self.n_components))
+        log_likelihood = np.empty(n)
+        for start in range(0, n, chunk_size):
+            chunk = self.transform(X[start:start + chunk_size])
+            log_norm, log_resp = log_normalize(weighted_log_prob(self.gmm, chunk, self.terms))
+            log_likelihood[start:start + chunk_size] = log_norm
+            probs[start:start + chunk_size] = np.exp(log_resp)
+        if self.score_mode == 'likelihood':
+            is_normal = log_likelihood >= self.threshold
+        else:
+            is_normal = np.argmax(probs, axis=1) == self.normal_component
+        return is_normal, probs, log_likelihood
+
+    def p_normal(self, probs):
+        # Xác suất thuộc thành phần normal
+        return probs[:, self.normal_component]
+
+    def predict_many(self, X):
+        # Chấm điểm cả lô (ví dụ mọi cổng trong một tick) bằng một lần gọi
+        is_normal, probs, _ = self.score_batch(X)
+        status = np.where(is_normal, "normal", "warning")
+        return status, probs
+
+    def predict_ports(self, X):
+        # Một tick của chế độ port (mỗi dòng một cổng): cổng bất thường khi log-likelihood
+        # dưới ngưỡng hiệu chỉnh theo tick. Trả về (cờ bất thường từng cổng, xác suất
+        # thuộc một thành phần normal của từng cổng)
+        _, probs, log_likelihood = self.score_batch(X)
+        threshold = self.tick_threshold if self.tick_threshold is not None else self.threshold
+        return log_likelihood < threshold, probs[:, self.normal_components].sum(axis=1)
+
+    def save(self, path, **metadata):
+        # Chỉ lưu mảng NumPy (không pickle) cùng bố cục cột và thông tin huấn luyện
+        metadata.update({
+            'version': CHECKPOINT_VERSION,
+            'n_components': self.n_components,
+            'reg_covar': self.reg_covar,
+            'covariance_type': self.gmm.covariance_type,
+            'projection': self.projection if self.proj is not None else None,
+            'projection_dim': self.projection_dim,
+            'normal_component': self.normal_component,
+            'score_mode': self.score_mode,
+            'threshold': self.threshold,
+            'tick_threshold': self.tick_threshold,
+            'normal_components': [int(k) for k in self.normal_components],
+            'threshold_percentile': self.threshold_percentile,
+            'n_samples': self.n_samples,
+            'n_features': self.n_features,
+            'trained_at': self.trained_at,
+            'n_updates': self.online.n_updates,
+        })
+        tmp = path + '.tmp.npz'
+        np.savez(
+            tmp,
+            **(self.proj.arrays() if self.proj is not None else {}),
+            metadata=np.array(json.dumps(metadata)),
+            columns=np.array(self.columns or [], dtype=str),
+            scaler_mean=self.scaler.mean_,
+            scaler_var=self.scaler.var_,
+            scaler_scale=self.scaler.scale_,
+            scaler_n_samples_seen=np.asarray(self.scaler.n_samples_seen_),
+            weights=self.gmm.weights_,
+            means=self.gmm.means_,
+            covariances=self.gmm.covariances_,
+            precisions_cholesky=self.gmm.precisions_cholesky_,
+            s0=self.online.s0,
+            s1=self.online.s1,
+            s2=self.online.s2,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            metadata = json.loads(str(f['metadata']))
+            if metadata.get('version') != CHECKPOINT_VERSION:
+                raise ValueError(f"Unsupported checkpoint version {metadata.get('version')}")
+            arrays = {name: f[name] for name in f.files}
+
+        model = cls(n_components=metadata['n_components'], reg_covar=metadata['reg_covar'],
+                    score_mode=metadata.get('score_mode', SCORE_MODE),
+                    threshold_percentile=metadata.get('threshold_percentile', THRESHOLD_PERCENTILE),
+                    covariance_type=metadata['covariance_type'],
+                    projection=metadata.get('projection'),
+                    projection_dim=metadata.get('projection_dim', PROJECTION_DIM))
+        if model.projection:
+            model.proj = Projection.from_arrays(model.projection, model.projection_dim, arrays)
+        model.threshold = metadata.get('threshold')
+        model.normal_component = metadata['normal_component']
+        model.tick_threshold = metadata.get('tick_threshold')
+        model.normal_components = np.array(metadata.get('normal_components', [model.normal_component]))
+        model.n_samples = metadata['n_samples']
+        model.n_features = metadata['n_features']
+        model.trained_at = metadata['trained_at']
+        model.columns = arrays['columns'].tolist() or None
+        model.metadata = metadata
+
+        model.scaler = StandardScaler()
+        model.scaler.mean_ = arrays['scaler_mean']
+        model.scaler.var_ = arrays['scaler_var']
+        model.scaler.scale_ = arrays['scaler_scale']
+        # Giữ dạng mảng NumPy theo từng đặc trưng như sau partial_fit của sklearn
+        model.scaler.n_samples_seen_ = np.array(np.broadcast_to(arrays['scaler_n_samples_seen'],
+                                                                (model.n_features,)), dtype=np.int64)
+        model.scaler.n_features_in_ = model.n_features
+
+        model.gmm = GaussianMixture(
+            n_components=model.n_components,
+            covariance_type=model.covariance_type,
+            random_state=model.random_state,
+            reg_covar=model.reg_covar
+        )
+        prec_chol = arrays['precisions_cholesky']
+        model.gmm.weights_ = arrays['weights']
+        model.gmm.means_ = arrays['means']
+        model.gmm.covariances_ = arrays['covariances']
+        model.gmm.precisions_cholesky_ = prec_chol
+        model.gmm.precisions_ = precisions_from_cholesky(prec_chol, model.covariance_type)
+        model.gmm.converged_ = True
+        model.gmm.n_iter_ = 0
+        model.gmm.lower_bound_ = -np.inf
+        model.gmm.n_features_in_ = model.gmm.means_.shape[1]
+
+        model.online = OnlineGMM(model.gmm, reg_covar=model.reg_covar)
+        model.online.s0 = arrays['s0']
+        model.online.s1 = arrays['s1']
+        model.online.s2 = arrays['s2']
+        model.online.n_updates = metadata['n_updates']
+        return model
+
+
+def checkpoint_paths(model_dir):
+    # Các checkpoint theo thứ tự phiên bản tăng dần
+    if not os.path.isdir(model_dir):
+        return []
+    names = sorted(n for n in os.listdir(model_dir) if CHECKPOINT_NAME.match(n))
+    return [os.path.join(model_dir, n) for n in names]
+
+
+def save_checkpoint(model, model_dir, keep=5, **metadata):
+    os.makedirs(model_dir, exist_ok=True)
+    paths = checkpoint_paths(model_dir)
+    version = int(CHECKPOINT_NAME.match(os.path.basename(paths[-1])).group(1)) + 1 if paths else 1
+    path = os.path.join(model_dir, f"gmm-{version:06d}.npz")
+    model.save(path, **metadata)
+    for old in paths[:max(0, len(paths) + 1 - keep)]:
+        os.remove(old)
+    return path
+
+
+def load_latest_checkpoint(model_dir, accept=lambda model: True):
+    # Checkpoint mới nhất đọc được và được hàm accept chấp nhận
+    for path in reversed(checkpoint_paths(model_dir)):
+        try:
+            model = Detector.load(path)
+        except Exception as e:
+            log.warning(f"Skipping checkpoint {path}: {e}")
+            continue
+        if accept(model):
+            return model, path
+    return None, None
@@ -0,0 +1,228 @@
+import time
+import threading
+import logging
+from concurrent.futures import wait
+import numpy as np
+import requests
+from trainer import BackgroundTrainer
+
+log = logging.getLogger('sdn')
+
+DEFAULT_CONTROLLER = 'default'
+FAILURE_THRESHOLD = 3  # Số lần lỗi liên tiếp trước khi tạm ngưng thăm dò controller
+BACKOFF = 5.0          # Thời gian tạm ngưng (giây), tăng gấp đôi mỗi lần lỗi tiếp, tối đa MAX_BACKOFF
+MAX_BACKOFF = 60.0
+
+
+def parse_controllers(spec, default_url):
+    # "c0=http://10.0.0.1:8080,c1=http://10.0.0.2:8080" -> {tên: URL}; rỗng: một controller mặc định
+    if not spec:
+        return {DEFAULT_CONTROLLER: default_url}
+    controllers = {}
+    for item in spec.split(','):
+        name, _, url = item.strip().partition('=')
+        if not url:
+            name, url = f"c{len(controllers)}", name
+        controllers[name.strip()] = url.strip().rstrip('/')
+    return controllers
+
+
+class Controller(object):
+    # Một Ryu: session và pool kết nối riêng, tự tạm ngưng khi lỗi liên tiếp
+    # để controller chết không ăn vào hạn chót của các controller khác
+
+    def __init__(self, name, url, pool_size):
+        self.name = name
+        self.url = url
+        self.http = requests.Session()
+        self.http.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.failures = 0
+        self.down_until = 0.0
+
+    def available(self, now=None):
+        return (time.time() if now is None else now) >= self.down_until
+
+    def post(self, path, payload, timeout):
+        try:
+            res = self.http.post(f"{self.url}{path}", json=payload, timeout=timeout)
+            if res.status_code != 200:
+                raise RuntimeError(f"HTTP {res.status_code}")
+            data = res.json()
+        except Exception:
+            self.failures += 1
+            if self.failures >= FAILURE_THRESHOLD:
+                backoff = min(BACKOFF * 2 ** (self.failures - FAILURE_THRESHOLD), MAX_BACKOFF)
+                self.down_until = time.time() + backoff
+                log.warning(f"Controller {self.name} failed {self.failures} times, pausing for {backoff:.0f}s")
+            raise
+        self.failures = 0
+        self.down_until = 0.0
+        return data
+
+
+class _Done(object):
+    # Kết quả của lời gọi đồng bộ, cùng giao diện result() với Future
+    def __init__(self, fn, *args):
+        try:
+            self._result, self._error = fn(*args), None
+        except Exception as e:
+            self._result, self._error = None, e
+
+    def result(self):
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class ControllerPool(object):
+    # Các controller Ryu và switch thuộc về từng controller (đăng ký qua /switch)
+
+    def __init__(self, urls, pool_size):
+        self.controllers = {name: Controller(name, url, pool_size) for name, url in urls.items()}
+        self.default = next(iter(self.controllers))
+        self.owner = {}      # dpid (str) -> tên controller
+        self.last_seen = {}  # tên controller -> thời điểm nhận mẫu đẩy gần nhất
+        self._partition = (None, None)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.controllers)
+
+    def assign(self, dpid, name=None):
+        if name not in self.controllers:
+            if name is not None:
+                log.warning(f"Unknown controller {name} for switch {dpid}, using {self.default}")
+            name = self.default
+        with self._lock:
+            self.owner[str(dpid)] = name
+
+    def controller_for(self, dpid):
+        return self.controllers[self.owner.get(str(dpid), self.default)]
+
+    def url_for(self, dpid):
+        return self.controller_for(dpid).url
+
+    def group(self, dpids):
+        groups = {}
+        for dpid in dpids:
+            groups.setdefault(self.owner.get(str(dpid), self.default), []).append(dpid)
+        return groups
+
+    def fetch_batch(self, path, key, dpids, timeout, executor):
+        # Gửi một yêu cầu batch tới mỗi controller cùng lúc; controller đang tạm ngưng
+        # hoặc lỗi chỉ làm thiếu switch của chính nó. Trả về ({dpid: stats}, [dpid thiếu])
+        requests_, missing = [], []
+        for name, group in self.group(dpids).items():
+            controller = self.controllers[name]
+            if not controller.available():
+                missing.extend(group)
+                continue
+            payload = {"dpids": [int(d) for d in group], "timeout": timeout}
+            requests_.append((controller, payload, group))
+
+        if len(requests_) == 1:
+            # Một controller: gọi thẳng, không qua pool luồng
+            controller, payload, group = requests_[0]
+            futures = {_Done(controller.post, path, payload, timeout + 0.5): (controller.name, group)}
+            not_done = ()
+        else:
+            futures = {executor.submit(controller.post, path, payload, timeout + 0.5): (controller.name, group)
+                       for controller, payload, group in requests_}
+            _, not_done = wait(futures, timeout=timeout + 0.5)
+
+        stats = {}
+        for future, (name, group) in futures.items():
+            if future in not_done:
+                future.cancel()
+                missing.extend(group)
+                continue
+            try:
+                data = future.result()
+            except Exception as e:
+                log.error(f"Batch request {path} to controller {name} failed: {e}")
+                missing.extend(group)
+                continue
+            stats.update((str(dpid), s) for dpid, s in data.get(key, {}).items())
+            missing.extend(str(d) for d in data.get("missing", []))
+        return stats, missing
+
+    def seen(self, name, now=None):
+        self.last_seen[name] = time.time() if now is None else now
+
+    def active(self, window, now=None):
+        # Controller đã đẩy mẫu gần đây: bộ ghép chỉ chờ các controller này
+        now = time.time() if now is None else now
+        return {name for name, t in self.last_seen.items() if now - t <= window}
+
+    def partition(self, columns):
+        # Chỉ số cột của từng controller, lưu lại theo bố cục cột
+        cached_columns, groups = self._partition
+        if cached_columns is not columns:
+            groups = {}
+            for j, key in enumerate(columns):
+                groups.setdefault(self.owner.get(key.split('-', 1)[0], self.default), []).append(j)
+            self._partition = (columns, groups)
+        return groups
+
+
+class ControllerDetectors(object):
+    # Mô hình riêng cho từng controller trên các cột của controller đó, song song với
+    # mô hình toàn hệ thống. Tổng số đặc trưng của các mô hình bằng số đặc trưng toàn
+    # hệ thống, nên chi phí vẫn tỉ lệ với số cổng.
+
+    def __init__(self, params, port_features, feature_mode, use_processes=False, min_samples=20):
+        self.params = params
+        self.port_features = port_features
+        self.feature_mode = feature_mode
+        self.use_processes = use_processes
+        self.min_samples = min_samples
+        self.models = {}
+        self.trainers = {}
+
+    def _install(self, name, model):
+        self.models[name] = model
+        log.info(f"[TRAIN] Controller {name} model trained with {model.n_samples} samples, {model.n_features} features")
+
+    def _trainer(self, name):
+        trainer = self.trainers.get(name)
+        if trainer is None:
+            trainer = self.trainers[name] = BackgroundTrainer(
+                lambda model, name=name: self._install(name, model), self.use_processes, self.params)
+        return trainer
+
+    def _feature_index(self, idx):
+        return (np.asarray(idx)[:, None] * self.port_features + np.arange(self.port_features)).ravel()
+
+    def update(self, ring, row, groups, score):
+        # groups: {controller: chỉ số cột}; score=False trong giai đoạn huấn luyện.
+        # Trả về {controller: trạng thái}
+        statuses = {}
+        port_mode = self.feature_mode == 'port'
+        for name, idx in groups.items():
+            columns = [ring.columns[j] for j in idx]
+            features = self._feature_index(idx)
+            model = self.models.get(name)
+            if model is not None and not port_mode and model.columns != columns:
+                model = None
+            if not score or model is None:
+                if len(ring) >= self.min_samples:
+                    X = ring.values()[:, features]
+                    if port_mode:
+                        self._trainer(name).submit(X.reshape(-1, self.port_features), columns, len(idx))
+                    else:
+                        self._trainer(name).submit(X, columns)
+                statuses[name] = 'train'
+                continue
+            x = ring.data[row, features].reshape(-1, self.port_features if port_mode else len(features))
+            try:
+                if port_mode:
+                    warning = model.predict_ports(x)[0].any()
+                else:
+                    warning = model.predict_many(x)[0][0] == 'warning'
+                if not warning:
+                    model.partial_fit(x)
+                statuses[name] = 'warning' if warning else 'normal'
+            except Exception as e:
+                log.error(f"Controller {name} prediction failed: {e}")
+                statuses[name] = 'error'
+        return statuses
@@ -0,0 +1,255 @@
+import zlib
+import numpy as np
+
+FLOW_CAPACITY = 65536    # Số flow tối đa được theo dõi mỗi switch (bộ nhớ có chặn)
+INITIAL_CAPACITY = 1024  # Bảng bắt đầu nhỏ và tăng gấp đôi khi cần, tới FLOW_CAPACITY
+ENTROPY_BUCKETS = 4096   # Số ô băm khi tính entropy src/dst
+SKETCH_DEPTH = 4
+SKETCH_WIDTH = 1024
+SKETCH_DECAY = 0.9       # Sketch giảm dần mỗi lần cập nhật (cửa sổ trượt mềm)
+TOP_K = 10
+
+# Mỗi switch thêm hai cột 4 đặc trưng vào mẫu, cạnh các cột "dpid-port":
+#   dpid-flows: số flow, tốc độ flow mới, tốc độ flow bị xóa, tổng packet/s
+#   dpid-dist:  entropy src, entropy dst, tỉ lệ byte của top-k src, của top-k dst
+FLOW_COLUMNS = ('flows', 'dist')
+
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(0x5d17)
+_HASH_A = _rng.randint(1, 1 << 30, size=SKETCH_DEPTH).astype(np.uint64)
+_HASH_B = _rng.randint(0, 1 << 30, size=SKETCH_DEPTH).astype(np.uint64)
+
+
+def is_flow_column(key):
+    return key.rsplit('-', 1)[-1] in FLOW_COLUMNS
+
+
+def _field(value):
+    # Trường có mask được trả về dạng (value, mask) hoặc list qua JSON
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _addr(value):
+    if isinstance(value, (list, tuple)):
+        value = value[0]
+    return None if value is None else str(value)
+
+
+def flow_record(table_id, priority, match, packet_count, byte_count, duration):
+    # match: dict các trường có cấu trúc (từ OFPMatch.items() hoặc JSON của REST).
+    # Khóa gồm mọi trường match (vlan, ipv6, arp, metadata...) để hai flow khác nhau
+    # không dùng chung một ô bộ đếm
+    key = (table_id, priority) + tuple(sorted((name, _field(value)) for name, value in match.items()))
+    src = _addr(match.get('ipv4_src') or match.get('eth_src'))
+    dst = _addr(match.get('ipv4_dst') or match.get('eth_dst'))
+    return key, src, dst, packet_count, byte_count, duration
+
+
+def heavy_match(side, addr):
+    # Match OpenFlow cho một heavy hitter (IPv4 hoặc MAC) ở phía src/dst
+    if '.' in addr:
+        return {'eth_type': 0x0800, f"ipv4_{side}": addr}
+    return {f"eth_{side}": addr}
+
+
+def _hash_addr(addr):
+    return 0 if addr is None else zlib.crc32(addr.encode())
+
+
+def _entropy(weights):
+    total = weights.sum()
+    if total <= 0:
+        return 0.0
+    p = weights[weights > 0] / total
+    return float(-(p * np.log2(p)).sum())
+
+
+class CountMinSketch(object):
+    # Ước lượng lưu lượng theo địa chỉ với bộ nhớ cố định depth x width
+
+    def __init__(self, depth=SKETCH_DEPTH, width=SKETCH_WIDTH):
+        self.width = width
+        self.table = np.zeros((depth, width), dtype=np.float32)
+        self.total = 0.0
+
+    def _rows(self, ids):
+        return ((_HASH_A[:, None] * ids[None, :] + _HASH_B[:, None]) % _PRIME) % np.uint64(self.width)
+
+    def decay(self, factor):
+        self.table *= factor
+        self.total *= factor
+
+    def add(self, ids, weights):
+        for r, idx in enumerate(self._rows(ids)):
+            self.table[r] += np.bincount(idx.astype(np.intp), weights=weights, minlength=self.width)
+        self.total += float(weights.sum())
+
+    def estimate(self, ids):
+        idx = self._rows(ids).astype(np.intp)
+        return self.table[np.arange(len(idx))[:, None], idx].min(axis=0)
+
+
+class FlowTable(object):
+    # Bảng flow nén của một switch: khóa -> ô, bộ đếm lưu trong mảng numpy theo ô.
+    # Flow không còn trong phản hồi bị xóa và ô được dùng lại; khi đầy, flow mới
+    # vẫn được tính (như flow mới mỗi lần) nhưng không được lưu.
+
+    def __init__(self, capacity=FLOW_CAPACITY):
+        self.capacity = capacity
+        self.index = {}
+        self.keys = []
+        self.free = []
+        size = min(INITIAL_CAPACITY, capacity)
+        self.packets = np.zeros(size)
+        self.bytes = np.zeros(size)
+        self.duration = np.zeros(size)
+        self.seen = np.zeros(size, dtype=np.int64)
+        self.in_use = np.zeros(size, dtype=bool)
+        self.generation = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def _allocate(self, key):
+        if not self.free:
+            size = len(self.packets)
+            if len(self.keys) < size:
+                self.free.append(len(self.keys))
+                self.keys.append(None)
+            elif size < self.capacity:
+                new_size = min(2 * size, self.capacity)
+                for name in ('packets', 'bytes', 'duration', 'seen', 'in_use'):
+                    old = getattr(self, name)
+                    grown = np.zeros(new_size, dtype=old.dtype)
+                    grown[:size] = old
+                    setattr(self, name, grown)
+                self.free.append(len(self.keys))
+                self.keys.append(None)
+            else:
+                return -1
+        slot = self.free.pop()
+        self.keys[slot] = key
+        self.index[key] = slot
+        self.in_use[slot] = True
+        return slot
+
+    def update(self, keys, packets, bytes_, duration):
+        # Một phản hồi đầy đủ của switch -> (packet/s, byte/s mỗi flow, mặt nạ flow mới, số flow bị xóa)
+        self.generation += 1
+        n = len(keys)
+        slots = np.empty(n, dtype=np.intp)
+        is_new = np.zeros(n, dtype=bool)
+        index = self.index
+        for i, key in enumerate(keys):
+            slot = index.get(key)
+            if slot is None:
+                is_new[i] = True
+                slot = self._allocate(key)
+            slots[i] = slot
+
+        pkt = np.asarray(packets, dtype=float)
+        byt = np.asarray(bytes_, dtype=float)
+        dur = np.asarray(duration, dtype=float)
+        prev_pkt, prev_byt, prev_dur = np.zeros(n), np.zeros(n), np.zeros(n)
+        old = ~is_new
+        prev_pkt[old] = self.packets[slots[old]]
+        prev_byt[old] = self.bytes[slots[old]]
+        prev_dur[old] = self.duration[slots[old]]
+
+        # Flow bị tạo lại với cùng khóa (duration hoặc bộ đếm giảm): tính từ 0
+        reset = (dur < prev_dur) | (pkt < prev_pkt) | (byt < prev_byt)
+        prev_pkt[reset] = prev_byt[reset] = prev_dur[reset] = 0
+        elapsed = dur - prev_dur
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pkt_rate = np.where(elapsed > 0, (pkt - prev_pkt) / elapsed, 0.0)
+            byte_rate = np.where(elapsed > 0, (byt - prev_byt) / elapsed, 0.0)
+
+        tracked = slots >= 0
+        s = slots[tracked]
+        self.packets[s] = pkt[tracked]
+        self.bytes[s] = byt[tracked]
+        self.duration[s] = dur[tracked]
+        self.seen[s] = self.generation
+
+        stale = np.flatnonzero(self.in_use & (self.seen != self.generation))
+        for slot in stale:
+            del index[self.keys[slot]]
+            self.keys[slot] = None
+            self.free.append(int(slot))
+        # Ô được dùng lại bắt đầu từ 0, không mang bộ đếm của flow cũ
+        self.in_use[stale] = False
+        self.packets[stale] = self.bytes[stale] = self.duration[stale] = 0
+        return pkt_rate, byte_rate, is_new, len(stale)
+
+
+class SwitchFlows(object):
+    def __init__(self, capacity):
+        self.table = FlowTable(capacity)
+        self.src_sketch = CountMinSketch()
+        self.dst_sketch = CountMinSketch()
+        self.last_update = None
+        self.heavy_hitters = {'src': [], 'dst': []}
+
+
+class FlowFeatures(object):
+    # Trích đặc trưng tổng hợp từ flow stats theo luồng, bộ nhớ có chặn cho mỗi switch
+
+    def __init__(self, capacity=FLOW_CAPACITY, top_k=TOP_K):
+        self.capacity = capacity
+        self.top_k = top_k
+        self.switches = {}
+
+    def _top_share(self, sketch, ids, addrs):
+        uniq, first = np.unique(ids, return_index=True)
+        if not len(uniq) or sketch.total <= 0:
+            return 0.0, []
+        est = sketch.estimate(uniq)
+        k = min(self.top_k, len(uniq))
+        top = np.argpartition(-est, k - 1)[:k]
+        top = top[np.argsort(-est[top])]
+        hitters = [(addrs[first[i]], float(est[i])) for i in top]
+        return float(min(est[top].sum() / sketch.total, 1.0)), hitters
+
+    def update(self, dpid, records, now):
+        # records: danh sách flow_record(...) của một phản hồi đầy đủ
+        st = self.switches.get(dpid)
+        if st is None:
+            st = self.switches[dpid] = SwitchFlows(self.capacity)
+        n = len(records)
+        if n:
+            keys, src, dst, packets, bytes_, duration = zip(*records)
+        else:
+            keys = src = dst = packets = bytes_ = duration = ()
+        pkt_rate, byte_rate, is_new, removed = st.table.update(keys, packets, bytes_, duration)
+
+        # Lần đầu thấy switch: mọi flow đều "mới", không tính tốc độ flow mới/xóa
+        elapsed = now - st.last_update if st.last_update is not None else 0
+        st.last_update = now
+        new_rate = is_new.sum() / elapsed if elapsed > 0 else 0.0
+        removed_rate = removed / elapsed if elapsed > 0 else 0.0
+
+        src_ids = np.fromiter((_hash_addr(a) for a in src), dtype=np.uint64, count=n)
+        dst_ids = np.fromiter((_hash_addr(a) for a in dst), dtype=np.uint64, count=n)
+        buckets = np.uint64(ENTROPY_BUCKETS)
+        src_entropy = _entropy(np.bincount((src_ids % buckets).astype(np.intp), weights=byte_rate, minlength=ENTROPY_BUCKETS))
+        dst_entropy = _entropy(np.bincount((dst_ids % buckets).astype(np.intp), weights=byte_rate, minlength=ENTROPY_BUCKETS))
+
+        st.src_sketch.decay(SKETCH_DECAY)
+        st.dst_sketch.decay(SKETCH_DECAY)
+        st.src_sketch.add(src_ids, byte_rate)
+        st.dst_sketch.add(dst_ids, byte_rate)
+        src_share, st.heavy_hitters['src'] = self._top_share(st.src_sketch, src_ids, src)
+        dst_share, st.heavy_hitters['dst'] = self._top_share(st.dst_sketch, dst_ids, dst)
+
+        return {
+            f"{dpid}-flows": [float(n), float(new_rate), float(removed_rate), float(pkt_rate.sum())],
+            f"{dpid}-dist": [src_entropy, dst_entropy, src_share, dst_share],
+        }
+
+    def heavy_hitters(self, dpid):
+        st = self.switches.get(dpid)
+        return st.heavy_hitters if st is not None else {'src': [], 'dst': []}
+
+    def forget(self, dpid):
+        # dpid cùng kiểu với lúc update (int trong Ryu, chuỗi trong app)
+        self.switches.pop(dpid, None)
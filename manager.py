@@ -1,15 +1,101 @@
 from ryu.base import app_manager
-from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, set_ev_cls
+from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISPATCHER, set_ev_cls
 from ryu.controller import ofp_event
 from ryu.ofproto import ofproto_v1_3
 from ryu.app.wsgi import WSGIApplication
+from ryu.lib import hub
 from restController import SwitchRestController
+from rates import counter_rates
+from flowFeatures import FlowFeatures, flow_record
+from metrics import REGISTRY
 
 import requests
 import json
+import os
+import threading
+import time
 
-APP_DOMAIN = 'http://127.0.0.1:5000'
+APP_DOMAIN = os.environ.get('SDN_APP_DOMAIN', 'http://127.0.0.1:5000')
 EP_CONNECT = f'{APP_DOMAIN}/switch'
+EP_DISCONNECT = f'{APP_DOMAIN}/switch/down'
+EP_PORT = f'{APP_DOMAIN}/port'
+EP_SAMPLES = f'{APP_DOMAIN}/samples'
+CONTROLLER_ID = os.environ.get('SDN_CONTROLLER_ID', 'default')  # Tên controller này trong SDN_CONTROLLERS của app
+PUSH_STATS = True    # Tự thăm dò portstats và đẩy delta tới app, không qua REST cho từng mẫu
+PUSH_INTERVAL = 0.5  # Chu kỳ thăm dò (giây), bằng T_SAMPLING của app
+PUSH_DEADLINE = 0.4  # Hạn chót chờ phản hồi của mỗi vòng (giây)
+MAX_ERRORS = 1024    # Số lỗi OpenFlow gần nhất được giữ lại
+PUSH_FLOW_FEATURES = True  # Thăm dò cả flow stats và gửi đặc trưng flow tổng hợp cùng delta cổng
+
+RTT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0)
+STATS_RTT = REGISTRY.histogram('sdn_ryu_reply_rtt_seconds', "Request to final reply time per switch",
+                               ('dpid',), RTT_BUCKETS)
+REPLY_TIMEOUTS = REGISTRY.counter('sdn_ryu_reply_timeouts_total', "Requests whose reply missed the wait timeout",
+                                  ('request',))
+PUSH_ROUND = REGISTRY.histogram('sdn_ryu_push_round_seconds', "Duration of one push polling round")
+PUSH_FAILURES = REGISTRY.counter('sdn_ryu_push_failures_total', "Failed POSTs of pushed samples")
+OPENFLOW_ERRORS = REGISTRY.counter('sdn_ryu_openflow_errors_total', "OpenFlow error messages", ('dpid',))
+DATAPATHS = REGISTRY.gauge('sdn_ryu_datapaths', "Connected datapaths")
+
+
+class ReplyBroker(object):
+    # Ghép phản hồi stats với yêu cầu theo (dpid, xid) của OpenFlow
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiting = {}
+
+    def send_request(self, dp, msg):
+        # Gán xid và đăng ký chờ trước khi gửi để không bỏ lỡ phản hồi nhanh
+        dp.set_xid(msg)
+        key = (dp.id, msg.xid)
+        with self._lock:
+            self._waiting[key] = {'event': threading.Event(), 'data': [],
+                                  'sent': time.perf_counter(), 'request': type(msg).__name__}
+        dp.send_msg(msg)
+        return key
+
+    def wait_reply(self, key, timeout):
+        with self._lock:
+            wait = self._waiting.get(key)
+        if wait is None:
+            return None
+        ok = wait['event'].wait(timeout=timeout)
+        with self._lock:
+            self._waiting.pop(key, None)
+        if not ok:
+            REPLY_TIMEOUTS.inc(request=wait['request'])
+        return wait['data'] if ok else None
+
+    def request(self, dp, msg, timeout):
+        return self.wait_reply(self.send_request(dp, msg), timeout)
+
+    def wait_all(self, keys, timeout):
+        # Chờ nhiều yêu cầu với cùng một hạn chót
+        deadline = time.time() + timeout
+        return {key: self.wait_reply(key, max(0, deadline - time.time())) for key in keys}
+
+    def feed(self, msg, stats):
+        # Nối các phần của phản hồi multipart, chỉ báo xong ở phần cuối
+        key = (msg.datapath.id, msg.xid)
+        with self._lock:
+            wait = self._waiting.get(key)
+            if wait is None:
+                return False
+            wait['data'].extend(stats)
+        # BarrierReply không có cờ multipart
+        if not getattr(msg, 'flags', 0) & msg.datapath.ofproto.OFPMPF_REPLY_MORE:
+            STATS_RTT.observe(time.perf_counter() - wait['sent'], dpid=key[0])
+            wait['event'].set()
+        return True
+
+    def drop(self, dpid):
+        # Datapath mất kết nối: trả None ngay cho mọi yêu cầu đang chờ, không đợi hết hạn
+        with self._lock:
+            waits = [wait for key, wait in self._waiting.items() if key[0] == dpid]
+        for wait in waits:
+            wait['data'] = None
+            wait['event'].set()
 
 
 class SwitchManager(app_manager.RyuApp):
@@ -19,9 +105,95 @@ class SwitchManager(app_manager.RyuApp):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.datapaths = {}
-        self._waiting_reply = {}
+        self.replies = ReplyBroker()
+        self.port_counters = {}   # (dpid, port_no) -> (bộ đếm, duration) lần trước
+        self._push_xids = set()   # (dpid, xid) của các yêu cầu do bộ thăm dò gửi
+        self._push_deltas = {}
+        self.poll_intervals = {}  # dpid -> chu kỳ thăm dò do app gửi lại (lịch thích ứng)
+        self.last_poll = {}       # dpid -> thời điểm thăm dò gần nhất
+        self.flow_features = FlowFeatures()
+        self._push_flows = {}     # (dpid, xid) -> các flow_record của phản hồi multipart đang ghép
+        self.errors = {}          # (dpid, xid) -> lỗi OpenFlow gần đây (để báo cho /flowmods)
         wsgi = kwargs['wsgi']
         wsgi.register(SwitchRestController, {'switch_app': self})
+        self.http = requests.Session()
+        if PUSH_STATS:
+            self.poller = hub.spawn(self._stats_poller)
+
+    def _stats_poller(self):
+        # Mỗi vòng gửi OFPPortStatsRequest tới mọi datapath, delta được tính ngay
+        # trong port_stats_reply_handler, cuối vòng gửi một lô gọn tới app.
+        # Switch có chu kỳ riêng (app trả về) chỉ được thăm dò khi tới lượt.
+        # Vòng bắt đầu ở bội số của PUSH_INTERVAL theo đồng hồ, để app ghép được
+        # các lô cùng tick từ nhiều controller.
+        while True:
+            hub.sleep(PUSH_INTERVAL - time.time() % PUSH_INTERVAL)
+            started = time.time()
+            self._push_deltas = {}
+            keys = []
+            for dp in list(self.datapaths.values()):
+                interval = self.poll_intervals.get(dp.id, PUSH_INTERVAL)
+                if started - self.last_poll.get(dp.id, 0) < interval - PUSH_INTERVAL / 2:
+                    continue
+                self.last_poll[dp.id] = started
+                reqs = [dp.ofproto_parser.OFPPortStatsRequest(dp, 0, dp.ofproto.OFPP_ANY)]
+                if PUSH_FLOW_FEATURES:
+                    reqs.append(dp.ofproto_parser.OFPFlowStatsRequest(dp))
+                for req in reqs:
+                    key = self.replies.send_request(dp, req)
+                    self._push_xids.add(key)
+                    keys.append(key)
+
+            self.replies.wait_all(keys, PUSH_DEADLINE)
+            self._push_xids.difference_update(keys)
+            for key in keys:
+                # Phản hồi flow chưa đủ các phần trước hạn chót bị bỏ
+                self._push_flows.pop(key, None)
+
+            # Gửi cả lô rỗng để app vẫn có mẫu cho tick (switch chưa tới lượt giữ tốc độ cũ)
+            if self.datapaths:
+                payload = json.dumps({'time': started, 'controller': CONTROLLER_ID,
+                                      'deltas': self._push_deltas}, separators=(',', ':'))
+                try:
+                    res = self.http.post(EP_SAMPLES, data=payload,
+                                         headers={'Content-Type': 'application/json'}, timeout=PUSH_DEADLINE)
+                    schedule = res.json().get('schedule') if res.status_code == 200 else None
+                    if schedule:
+                        self.poll_intervals = {int(dpid): interval for dpid, interval in schedule.items()}
+                except Exception as e:
+                    PUSH_FAILURES.inc()
+                    self.logger.warning("Pushing samples failed: %s", e)
+
+            PUSH_ROUND.observe(time.time() - started)
+            DATAPATHS.set(len(self.datapaths))
+
+    def _update_port_deltas(self, dpid, body):
+        for stat in body:
+            if stat.port_no == 4294967294:
+                continue
+            counters = (stat.rx_packets, stat.tx_packets, stat.rx_bytes, stat.tx_bytes)
+            duration = stat.duration_sec + stat.duration_nsec * 1e-9
+            # Cổng mới xuất hiện lần đầu có tốc độ 0
+            prev = self.port_counters.get((dpid, stat.port_no))
+            self.port_counters[(dpid, stat.port_no)] = (counters, duration)
+            self._push_deltas[f"{dpid}-{stat.port_no}"] = counter_rates(counters, duration, prev)
+
+    def pop_errors(self, dpid, xids):
+        return [self.errors.pop((dpid, xid)) for xid in xids if (dpid, xid) in self.errors]
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, MAIN_DISPATCHER)
+    def error_msg_handler(self, ev):
+        msg = ev.msg
+        if len(self.errors) >= MAX_ERRORS:
+            self.errors.pop(next(iter(self.errors)))
+        self.errors[(msg.datapath.id, msg.xid)] = {'xid': msg.xid, 'type': msg.type, 'code': msg.code}
+        OPENFLOW_ERRORS.inc(dpid=msg.datapath.id)
+        self.logger.warning("OpenFlow error from switch %s: xid=%s type=%s code=%s",
+                            msg.datapath.id, msg.xid, msg.type, msg.code)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def barrier_reply_handler(self, ev):
+        self.replies.feed(ev.msg, [])
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
@@ -29,7 +201,7 @@ class SwitchManager(app_manager.RyuApp):
         dpid = dp.id
         self.datapaths[dpid] = dp
 
-        payload = {'dpid': dpid}
+        payload = {'dpid': dpid, 'controller': CONTROLLER_ID}
         try:
             res = requests.post(EP_CONNECT, json=payload)
             status = (res.json().get('status', 'failed'), res.status_code)
@@ -54,35 +226,97 @@ class SwitchManager(app_manager.RyuApp):
         dp.send_msg(mod)
         print(f"[+] Default FLOOD flow installed on switch {dpid}")
 
+    def _notify(self, url, payload):
+        # Báo cho app ở luồng riêng, không chặn vòng sự kiện của Ryu
+        def send():
+            try:
+                self.http.post(url, json=payload, timeout=2)
+            except Exception as e:
+                self.logger.warning("Notifying %s failed: %s", url, e)
+        hub.spawn(send)
+
+    @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, DEAD_DISPATCHER])
+    def state_change_handler(self, ev):
+        dp = ev.datapath
+        if ev.state != DEAD_DISPATCHER or dp.id is None or self.datapaths.get(dp.id) is not dp:
+            return
+        # Bỏ switch khỏi vòng thăm dò ngay, không tốn hạn chót cho switch đã chết
+        dpid = dp.id
+        del self.datapaths[dpid]
+        self.replies.drop(dpid)
+        self.poll_intervals.pop(dpid, None)
+        self.last_poll.pop(dpid, None)
+        self.flow_features.forget(dpid)
+        for key in [key for key in self.port_counters if key[0] == dpid]:
+            del self.port_counters[key]
+        self._notify(EP_DISCONNECT, {'dpid': dpid, 'controller': CONTROLLER_ID})
+        self.logger.info("Switch %s disconnected", dpid)
+
+    @set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
+    def port_status_handler(self, ev):
+        msg = ev.msg
+        dpid = msg.datapath.id
+        ofp = msg.datapath.ofproto
+        reason = {ofp.OFPPR_ADD: 'add', ofp.OFPPR_DELETE: 'delete', ofp.OFPPR_MODIFY: 'modify'}.get(msg.reason)
+        if reason is None:
+            return
+        port_no = msg.desc.port_no
+        live = reason != 'delete' and not msg.desc.state & ofp.OFPPS_LINK_DOWN
+        if reason == 'delete':
+            # Cổng được tạo lại bắt đầu bộ đếm mới
+            self.port_counters.pop((dpid, port_no), None)
+        self._notify(EP_PORT, {'dpid': dpid, 'port': port_no, 'reason': reason, 'live': bool(live),
+                               'controller': CONTROLLER_ID})
+        self.logger.info("Port %s of switch %s: %s (live=%s)", port_no, dpid, reason, live)
+
+    def _update_flow_features(self, msg):
+        # Ghép các phần của phản hồi multipart, tính đặc trưng flow một lần ở phần cuối
+        key = (msg.datapath.id, msg.xid)
+        records = self._push_flows.setdefault(key, [])
+        records.extend(
+            flow_record(stat.table_id, stat.priority, dict(stat.match.items()),
+                        stat.packet_count, stat.byte_count, stat.duration_sec + stat.duration_nsec * 1e-9)
+            for stat in msg.body)
+        if not msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE:
+            records = self._push_flows.pop(key)
+            self._push_deltas.update(self.flow_features.update(msg.datapath.id, records, time.time()))
+
     @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
     def flow_stats_reply_handler(self, ev):
         dpid = ev.msg.datapath.id
         body = ev.msg.body
 
+        if (dpid, ev.msg.xid) in self._push_xids:
+            self._update_flow_features(ev.msg)
+            self.replies.feed(ev.msg, [])
+            return
+
         stats = [{
+            'table_id': stat.table_id,
             'priority': stat.priority,
-            'match': str(stat.match),
+            'match': dict(stat.match.items()),
             'actions': [str(a) for a in stat.instructions],
             'packet_count': stat.packet_count,
-            'byte_count': stat.byte_count
+            'byte_count': stat.byte_count,
+            'duration_sec': stat.duration_sec,
+            'duration_nsec': stat.duration_nsec
         } for stat in body]
 
-        wait = self._waiting_reply.get(dpid)
-        if wait:
-            wait['data'] = stats
-            wait['event'].set()
+        self.replies.feed(ev.msg, stats)
 
-        print(json.dumps({
-            "event": "FlowStatsReply",
-            "dpid": dpid,
-            "count": len(stats)
-        }, indent=2))
+        self.logger.debug("%s from switch %s: %d entries", "FlowStatsReply", dpid, len(stats))
         
     @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
     def port_stats_reply_handler(self, ev):
         dpid = ev.msg.datapath.id
         body = ev.msg.body
 
+        if (dpid, ev.msg.xid) in self._push_xids:
+            # Phản hồi của bộ thăm dò: chỉ tính delta, không dựng dict hay in log
+            self._update_port_deltas(dpid, body)
+            self.replies.feed(ev.msg, [])
+            return
+
         stats = [{
             'port_no': stat.port_no,
             'rx_packets': stat.rx_packets,
@@ -91,19 +325,14 @@ class SwitchManager(app_manager.RyuApp):
             'tx_bytes': stat.tx_bytes,
             'rx_errors': stat.rx_errors,
             'tx_errors': stat.tx_errors,
-            'collisions': stat.collisions
+            'collisions': stat.collisions,
+            'duration_sec': stat.duration_sec,
+            'duration_nsec': stat.duration_nsec
         } for stat in body]
 
-        wait = self._waiting_reply.get(dpid)
-        if wait:
-            wait['data'] = stats
-            wait['event'].set()
+        self.replies.feed(ev.msg, stats)
 
-        print(json.dumps({
-            "event": "PortStatsReply",
-            "dpid": dpid,
-            "count": len(stats)
-        }, indent=2))
+        self.logger.debug("%s from switch %s: %d entries", "PortStatsReply", dpid, len(stats))
 
     @set_ev_cls(ofp_event.EventOFPTableStatsReply, MAIN_DISPATCHER)
     def table_stats_reply_handler(self, ev):
@@ -117,13 +346,6 @@ class SwitchManager(app_manager.RyuApp):
             'matched_count': stat.matched_count
         } for stat in body]
 
-        wait = self._waiting_reply.get(dpid)
-        if wait:
-            wait['data'] = stats
-            wait['event'].set()
+        self.replies.feed(ev.msg, stats)
 
-        print(json.dumps({
-            "event": "TableStatsReply",
-            "dpid": dpid,
-            "count": len(stats)
-        }, indent=2))
\ No newline at end of file
+        self.logger.debug("%s from switch %s: %d entries", "TableStatsReply", dpid, len(stats))
\ No newline at end of file
@@ -0,0 +1,136 @@
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from flowFeatures import is_flow_column, heavy_match
+
+MITIGATION_ACTIONS = ('meter', 'drop')
+log = logging.getLogger('sdn')
+
+
+def column_z(scaler, x, n_columns, width):
+    # Chế độ global: độ lệch chuẩn hóa lớn nhất theo chiều tăng của từng cột
+    return ((np.asarray(x, dtype=float) - scaler.mean_) / scaler.scale_).reshape(n_columns, width).max(axis=1)
+
+
+def offending_columns(scaler, x, columns, width, z_threshold):
+    # Chế độ global: cột (cổng hoặc cột flow) có đặc trưng tăng vượt z_threshold độ lệch chuẩn
+    return [columns[j] for j in np.flatnonzero(column_z(scaler, x, len(columns), width) > z_threshold)]
+
+
+class MitigationEngine(object):
+    # Khi có warning: dựng rule cho các cổng/flow vi phạm và gửi theo lô qua /flowmods
+    # của Ryu (một lần gọi cho mỗi controller, có barrier xác nhận). Rule tự hết hạn bằng
+    # idle/hard timeout; rule vừa gửi không bị gửi lại trong idle_timeout giây.
+    # Việc gửi chạy ở luồng riêng, luồng lấy mẫu không bị chặn; các yêu cầu đến trong
+    # lúc đang gửi được gộp lại.
+
+    def __init__(self, controllers, action='meter', rate_kbps=1000, priority=100, idle_timeout=10,
+                 hard_timeout=60, meter_id=1, heavy_top=3, flow_features=None, timeout=1.0):
+        if action not in MITIGATION_ACTIONS:
+            raise ValueError(f"Unknown mitigation action: {action}")
+        self.controllers = controllers  # ControllerPool: switch nào gửi tới Ryu nào
+        self.action = action
+        self.rate_kbps = rate_kbps
+        self.priority = priority
+        self.idle_timeout = idle_timeout
+        self.hard_timeout = hard_timeout
+        self.meter_id = meter_id  # meter_id đầu tiên; mỗi mục tiêu có meter riêng từ đây trở đi
+        self.heavy_top = heavy_top
+        self.flow_features = flow_features  # Chế độ pull: heavy hitter được theo dõi tại app
+        self.timeout = timeout
+        self.active = {}     # (dpid, mục tiêu) -> thời điểm được gửi lại
+        self.meter_ids = {}  # (dpid, mục tiêu) -> meter_id riêng của mục tiêu
+        self.meters = set()  # mục tiêu đã được switch xác nhận cài meter
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mitigation')
+        self._lock = threading.Lock()
+        self._running = False
+        self._pending = None
+
+    def submit(self, columns, now):
+        with self._lock:
+            if self._running:
+                self._pending = (columns, now)
+                return
+            self._running = True
+        self.executor.submit(self._run, columns, now)
+
+    def _run(self, columns, now):
+        while True:
+            try:
+                self._install(columns, now)
+            except Exception as e:
+                log.error(f"Mitigation failed: {e}")
+            with self._lock:
+                if self._pending is None:
+                    self._running = False
+                    return
+                (columns, now), self._pending = self._pending, None
+
+    def _rule(self, dpid, match=None, heavy=None):
+        mod = {'dpid': int(dpid), 'command': 'add', 'priority': self.priority,
+               'idle_timeout': self.idle_timeout, 'hard_timeout': self.hard_timeout,
+               'match': match or {}}
+        if heavy is not None:
+            mod['heavy'], mod['top'] = heavy, self.heavy_top
+        if self.action == 'meter':
+            # Giới hạn tốc độ rồi chuyển tiếp như flow mặc định (FLOOD)
+            # (meter_id thật gán khi gửi, mỗi mục tiêu một meter để không chia chung một giới hạn)
+            mod['meter_id'] = None
+            mod['actions'] = [{'type': 'flood'}]
+        else:
+            mod['actions'] = []
+        return mod
+
+    def _targets(self, dpid, target):
+        # Cột cổng -> chặn theo in_port; cột flow -> chặn các heavy hitter của switch
+        if not is_flow_column(target):
+            return [(target, self._rule(dpid, match={'in_port': int(target.split('-', 1)[1])}))]
+        if self.flow_features is None:
+            return [(f"{dpid}-heavy", self._rule(dpid, heavy='src'))]
+        hitters = self.flow_features.heavy_hitters(dpid)['src'][:self.heavy_top]
+        return [(f"{dpid}-{addr}", self._rule(dpid, match=heavy_match('src', addr)))
+                for addr, _ in hitters if addr is not None]
+
+    def _meter_for(self, key):
+        if key not in self.meter_ids:
+            self.meter_ids[key] = self.meter_id + len(self.meter_ids)
+        return self.meter_ids[key]
+
+    def _install(self, columns, now):
+        mods, meters, keys = [], [], []
+        for column in columns:
+            dpid = column.split('-', 1)[0]
+            for key, mod in self._targets(dpid, column):
+                if self.active.get(key, 0) > now:
+                    continue
+                keys.append(key)
+                mods.append(mod)
+                if self.action == 'meter':
+                    mod['meter_id'] = self._meter_for(key)
+                    if key not in self.meters:
+                        meters.append((key, {'dpid': int(dpid), 'meter_id': mod['meter_id'],
+                                             'rate': self.rate_kbps}))
+        if not mods:
+            return
+
+        results = {}
+        for name, dpids in self.controllers.group({str(m['dpid']) for m in mods}).items():
+            payload = {'mods': [m for m in mods if str(m['dpid']) in dpids],
+                       'meters': [m for _, m in meters if str(m['dpid']) in dpids], 'timeout': self.timeout}
+            try:
+                data = self.controllers.controllers[name].post('/flowmods', payload, self.timeout + 0.5)
+            except Exception as e:
+                log.error(f"Mitigation via controller {name} failed: {e}")
+                continue
+            results.update(data.get('results', {}))
+        for key, meter in meters:
+            # Meter đã tồn tại cũng trả lỗi nhưng vẫn dùng được, chỉ cần switch xác nhận
+            if results.get(str(meter['dpid']), {}).get('confirmed'):
+                self.meters.add(key)
+        for key in keys:
+            if str(key).split('-', 1)[0] in results:
+                self.active[key] = now + self.idle_timeout
+        confirmed = sum(1 for r in results.values() if r.get('confirmed'))
+        log.warning(f"[MITIGATE] {self.action} rules for {', '.join(columns)}: {len(mods)} mods, "
+                    f"{confirmed}/{len(results)} switches confirmed")
@@ -0,0 +1,157 @@
+import os
+import time
+import itertools
+import multiprocessing
+from multiprocessing.connection import wait
+import numpy as np
+from detector import SCORE_MODE
+from trainer import train_detector
+
+# Lưới mặc định: số thành phần x kiểu hiệp phương sai x hệ số regularization
+N_COMPONENTS_GRID = (1, 2, 3, 4, 6, 8)
+COVARIANCE_GRID = ('full', 'tied', 'diag', 'spherical')
+REG_COVAR_GRID = (1e-6, 1e-4, 1e-2)
+CRITERIA = ('heldout', 'bic')
+HOLDOUT = 0.2       # Phần cuối (theo thời gian) của dữ liệu dùng để chấm held-out likelihood
+TOTAL_BUDGET = 60   # Hạn chót của cả lượt chọn mô hình (giây)
+FIT_BUDGET = 5      # Ứng viên huấn luyện lâu hơn bị dừng và loại (không hợp cho việc huấn luyện lại định kỳ)
+
+# Chi phí tương đối để thử ứng viên rẻ trước, tận dụng tốt hạn chót
+_COVARIANCE_COST = {'spherical': 1, 'diag': 2, 'tied': 3, 'full': 4}
+
+
+def candidate_grid(n_components=N_COMPONENTS_GRID, covariance_types=COVARIANCE_GRID, reg_covars=REG_COVAR_GRID):
+    grid = [{'n_components': k, 'covariance_type': c, 'reg_covar': r}
+            for k, c, r in itertools.product(n_components, covariance_types, reg_covars)]
+    return sorted(grid, key=lambda p: p['n_components'] * _COVARIANCE_COST[p['covariance_type']])
+
+
+def _evaluate(params, X_train, X_held, rows_per_tick):
+    started = time.perf_counter()
+    model = train_detector(X_train, params=params, rows_per_tick=rows_per_tick)
+    fit_time = time.perf_counter() - started
+    _, _, log_likelihood = model.score_batch(X_held)
+    return {
+        'params': params,
+        'fit_time': fit_time,
+        'bic': float(model.gmm.bic(model.transform(X_train))),
+        'heldout': float(np.mean(log_likelihood)),
+    }
+
+
+def _worker_main(conn, X_train, X_held, rows_per_tick):
+    # Mỗi tiến trình nhận dữ liệu một lần, báo sẵn sàng (đã import xong) rồi lần lượt
+    # thử các ứng viên được giao
+    conn.send(None)
+    while True:
+        params = conn.recv()
+        try:
+            conn.send(_evaluate(params, X_train, X_held, rows_per_tick))
+        except Exception as e:
+            conn.send({'params': None, 'error': str(e)})
+
+
+class _Worker(object):
+    # Tiến trình thử ứng viên thuộc về một lượt chọn mô hình, có thể dừng riêng từng tiến trình
+
+    def __init__(self, ctx, X_train, X_held, rows_per_tick):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, name='model-select',
+                                   args=(child, X_train, X_held, rows_per_tick), daemon=True)
+        self.process.start()
+        child.close()
+        self.params = None
+        self.deadline = None
+
+    def assign(self, params, deadline):
+        self.params, self.deadline = params, deadline
+        self.conn.send(params)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+def split(X, holdout=HOLDOUT, rows_per_tick=1):
+    # Tách theo thời gian: các tick cuối làm tập held-out (X đã theo thứ tự thời gian)
+    n_ticks = X.shape[0] // rows_per_tick
+    n_held = max(1, int(n_ticks * holdout)) * rows_per_tick
+    return X[:-n_held], X[-n_held:]
+
+
+def select_model(X, columns=None, base_params=None, grid=None, criterion='heldout', workers=None,
+                 total_budget=TOTAL_BUDGET, fit_budget=FIT_BUDGET, rows_per_tick=1):
+    # Thử song song các ứng viên trên nhiều lõi, xếp hạng theo held-out likelihood
+    # (cao hơn tốt hơn) hoặc BIC (thấp hơn tốt hơn), rồi huấn luyện lại ứng viên
+    # tốt nhất trên toàn bộ dữ liệu. Trả về (mô hình, tham số, bảng kết quả).
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown selection criterion: {criterion}")
+    X = np.asarray(X, dtype=float)
+    X_train, X_held = split(X, rows_per_tick=rows_per_tick)
+    base_params = dict(base_params or {})
+    grid = [dict(base_params, **p) for p in (grid or candidate_grid())]
+    # Không thể có nhiều thành phần hơn số mẫu huấn luyện
+    grid = [p for p in grid if p['n_components'] < X_train.shape[0]]
+    # Chấm theo thành phần normal: GMM một thành phần xếp mọi mẫu vào thành phần đó, không bao giờ báo warning
+    grid = [p for p in grid if p['n_components'] > 1 or p.get('score_mode', SCORE_MODE) == 'likelihood']
+
+    results = []
+    deadline = time.time() + total_budget
+    # 'spawn': tiến trình con không thừa hưởng luồng và khóa của Flask/Ryu như khi fork
+    ctx = multiprocessing.get_context('spawn')
+    queue = list(grid)
+    # Tiến trình đang khởi động (chưa tính vào hạn của ứng viên), rảnh, đang thử ứng viên
+    starting = [_Worker(ctx, X_train, X_held, rows_per_tick)
+                for _ in range(min(workers or os.cpu_count(), len(queue)))]
+    idle, busy = [], []
+    try:
+        while (queue or busy) and (starting or idle or busy) and time.time() < deadline:
+            while queue and idle:
+                worker = idle.pop()
+                worker.assign(queue.pop(0), min(time.time() + fit_budget, deadline))
+                busy.append(worker)
+            ready = wait([w.conn for w in starting + busy],
+                         timeout=max(0, min([w.deadline for w in busy] + [deadline]) - time.time()))
+            now = time.time()
+            for worker in list(starting):
+                if worker.conn in ready:
+                    starting.remove(worker)
+                    try:
+                        worker.conn.recv()
+                        idle.append(worker)
+                    except EOFError:
+                        worker.stop()
+            for worker in list(busy):
+                if worker.conn in ready:
+                    busy.remove(worker)
+                    try:
+                        results.append(worker.conn.recv())
+                        idle.append(worker)
+                        continue
+                    except EOFError:
+                        results.append({'params': None, 'error': f"Worker exited while fitting {worker.params}"})
+                elif worker.deadline <= now:
+                    # Ứng viên quá hạn bị dừng ngay, không chiếm lõi tới khi tự xong
+                    busy.remove(worker)
+                    results.append({'params': None, 'error': f"Candidate {worker.params} stopped at its deadline"})
+                else:
+                    continue
+                worker.stop()
+                if queue and now < deadline:
+                    starting.append(_Worker(ctx, X_train, X_held, rows_per_tick))
+    finally:
+        # Tiến trình còn bận sau hạn chót hoặc đang rảnh đều được dừng trước khi huấn luyện lại ứng viên tốt nhất
+        for worker in starting + idle + busy:
+            worker.stop()
+
+    eligible = [r for r in results if r.get('params') is not None and r['fit_time'] <= fit_budget
+                and np.isfinite(r[criterion])]
+    if not eligible:
+        return None, None, results
+    if criterion == 'bic':
+        best = min(eligible, key=lambda r: r['bic'])
+    else:
+        best = max(eligible, key=lambda r: r['heldout'])
+    model = train_detector(X, columns, best['params'], rows_per_tick)
+    return model, best['params'], results
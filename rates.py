@@ -0,0 +1,34 @@
+COUNTER_WRAP = 2 ** 64  # Bộ đếm cổng OpenFlow là uint64
+
+
+def port_duration(port, fallback):
+    # Thời gian sống của cổng (giây) do switch báo; không có thì dùng thời điểm nhận
+    if 'duration_sec' not in port:
+        return fallback
+    return port['duration_sec'] + port.get('duration_nsec', 0) * 1e-9
+
+
+def counter_rates(counters, duration, prev):
+    # Đổi bộ đếm tích lũy thành tốc độ mỗi giây theo đồng hồ của chính switch,
+    # nên độ trễ HTTP hay chu kỳ lấy mẫu thay đổi không làm méo đặc trưng.
+    #   prev: (counters, duration) lần trước, None nếu cổng mới xuất hiện (tốc độ 0)
+    if prev is None:
+        return [0.0] * len(counters)
+    prev_counters, prev_duration = prev
+    elapsed = duration - prev_duration
+    if elapsed < 0:
+        # duration giảm: cổng đã được reset, bộ đếm tính lại từ 0 trong `duration` giây
+        return [c / duration if duration > 0 else 0.0 for c in counters]
+    if elapsed == 0:
+        return [0.0] * len(counters)
+
+    rates = []
+    for c, p in zip(counters, prev_counters):
+        delta = c - p
+        if delta < 0:
+            delta += COUNTER_WRAP
+            if delta >= COUNTER_WRAP // 2:
+                # Quá lớn để là tràn số thật: bộ đếm bị xóa mà duration không reset
+                delta = c
+        rates.append(delta / elapsed)
+    return rates
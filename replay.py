@@ -0,0 +1,95 @@
+import argparse
+import time
+import numpy as np
+from detector import Detector, checkpoint_paths, SCORE_CHUNK
+from tsStore import TimeSeriesStore
+
+PORT_FEATURES = 4
+
+
+def load_features(args, model):
+    # Trả về (ma trận vector theo tick, thời gian, bố cục cột) từ file .npy hoặc kho dữ liệu
+    if args.input:
+        X = np.load(args.input, allow_pickle=False)
+        return np.atleast_2d(X), None, model.columns
+
+    store = TimeSeriesStore(args.store, PORT_FEATURES)
+    parts = store.query(args.t_from, args.t_to)
+    if model.metadata.get('feature_mode') != 'port':
+        # Chế độ global: lược đồ cột chỉ nối thêm, segment có các cột đầu trùng bố cục
+        # của mô hình vẫn chấm được trên đúng các cột đó
+        n = len(model.columns)
+        parts = [dict(p, vector=p['vector'][:, :n * PORT_FEATURES], columns=model.columns)
+                 for p in parts if p['columns'][:n] == model.columns]
+    if not parts:
+        raise SystemExit("No stored samples match the model layout")
+    columns = parts[-1]['columns']
+    parts = [p for p in parts if p['columns'] == columns]
+    return (np.concatenate([p['vector'] for p in parts]),
+            np.concatenate([p['timestamp'] for p in parts]),
+            columns)
+
+
+def replay(model, X, chunk_size=SCORE_CHUNK):
+    # Chấm điểm toàn bộ ma trận; chế độ port: tick là warning nếu có cổng dưới ngưỡng
+    # hiệu chỉnh theo tick (như app)
+    if model.metadata.get('feature_mode') == 'port':
+        n_ticks = X.shape[0]
+        _, probs, log_likelihood = model.score_batch(X.reshape(-1, PORT_FEATURES), chunk_size)
+        threshold = model.tick_threshold if model.tick_threshold is not None else model.threshold
+        port_normal = (log_likelihood >= threshold).reshape(n_ticks, -1)
+        return {
+            'status': np.where(port_normal.all(axis=1), 'normal', 'warning'),
+            'port_status': np.where(port_normal, 'normal', 'warning'),
+            'probs': probs.reshape(n_ticks, -1, model.n_components),
+            'log_likelihood': log_likelihood.reshape(n_ticks, -1),
+        }
+
+    is_normal, probs, log_likelihood = model.score_batch(X, chunk_size)
+    return {
+        'status': np.where(is_normal, 'normal', 'warning'),
+        'probs': probs,
+        'log_likelihood': log_likelihood,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded feature vectors against a GMM checkpoint")
+    parser.add_argument('--model', help="Checkpoint .npz (default: newest in --model-dir)")
+    parser.add_argument('--model-dir', default='data/models')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--input', help=".npy matrix of per-tick feature vectors")
+    source.add_argument('--store', help="Sample store directory, e.g. data/samples")
+    parser.add_argument('--from', dest='t_from', type=float, help="Start time (epoch seconds)")
+    parser.add_argument('--to', dest='t_to', type=float, help="End time (epoch seconds)")
+    parser.add_argument('--chunk', type=int, default=SCORE_CHUNK)
+    parser.add_argument('--output', help="Write status/probs/log_likelihood arrays to this .npz")
+    args = parser.parse_args()
+
+    path = args.model
+    if path is None:
+        paths = checkpoint_paths(args.model_dir)
+        if not paths:
+            raise SystemExit(f"No checkpoint found in {args.model_dir}")
+        path = paths[-1]
+    model = Detector.load(path)
+
+    X, timestamps, columns = load_features(args, model)
+    started = time.perf_counter()
+    result = replay(model, X, args.chunk)
+    elapsed = time.perf_counter() - started
+
+    n_warning = int(np.sum(result['status'] == 'warning'))
+    print(f"Scored {X.shape[0]} samples ({X.shape[1]} features) with {path} in {elapsed:.3f}s "
+          f"({X.shape[0] / max(elapsed, 1e-9):.0f} samples/s), {n_warning} warnings")
+
+    if args.output:
+        if timestamps is not None:
+            result['timestamp'] = timestamps
+        result['columns'] = np.array(columns or [], dtype=str)
+        np.savez(args.output, **result)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,20 @@
 from ryu.app.wsgi import ControllerBase, route
 from webob import Response
 import json
-import threading
+from flowFeatures import heavy_match
+from metrics import REGISTRY, CONTENT_TYPE
 
 URL_FLOWMOD = '/flowmod'
+URL_FLOWMOD_BATCH = '/flowmods'
 URL_FLOWSTATS = '/flowstats/{dpid}'
 URL_PORTSTATS = '/portstats/{dpid}'
 URL_TABLESTATS = '/tablestats/{dpid}'
+URL_FLOWSTATS_BATCH = '/flowstats'
+URL_PORTSTATS_BATCH = '/portstats'
+URL_TABLESTATS_BATCH = '/tablestats'
+URL_METRICS = '/metrics'
+
+REPLY_TIMEOUT = 2  # Thời gian chờ phản hồi mặc định (giây)
 
 
 class SwitchRestController(ControllerBase):
@@ -14,90 +22,209 @@ class SwitchRestController(ControllerBase):
         super().__init__(req, link, data, **config)
         self.switch_app = data['switch_app']
 
+    def _collect_stats(self, req, make_request, key):
+        # Gửi yêu cầu stats tới nhiều switch cùng lúc và gom phản hồi
+        body = req.json_body if req.body else {}
+        requested = body.get('dpids', 'all')
+        timeout = float(body.get('timeout', REPLY_TIMEOUT))
+
+        if requested == 'all':
+            dpids = list(self.switch_app.datapaths.keys())
+        else:
+            dpids = [int(d) for d in requested]
+
+        pending = {}
+        missing = []
+        for dpid in dpids:
+            dp = self.switch_app.datapaths.get(dpid)
+            if not dp:
+                missing.append(dpid)
+                continue
+            pending[self.switch_app.replies.send_request(dp, make_request(dp))] = dpid
+
+        stats = {}
+        for reply_key, data in self.switch_app.replies.wait_all(pending, timeout).items():
+            if data is None:
+                missing.append(pending[reply_key])
+            else:
+                stats[pending[reply_key]] = data
+
+        return Response(content_type='application/json; charset=utf-8',
+                        body=json.dumps({key: stats, 'missing': missing}))
+
+    def _flow_mod(self, dp, spec):
+        # Dựng OFPFlowMod từ mô tả JSON: command, strict, match, actions, priority,
+        # idle_timeout, hard_timeout, meter_id (tùy chọn)
+        ofp = dp.ofproto
+        parser = dp.ofproto_parser
+        command = spec.get('command', 'add')  # add, modify, delete
+        strict = spec.get('strict', False)
+
+        # 1. Map lệnh
+        if command == 'add':
+            ofp_cmd = ofp.OFPFC_ADD
+        elif command == 'modify':
+            ofp_cmd = ofp.OFPFC_MODIFY_STRICT if strict else ofp.OFPFC_MODIFY
+        elif command == 'delete':
+            ofp_cmd = ofp.OFPFC_DELETE_STRICT if strict else ofp.OFPFC_DELETE
+        else:
+            raise ValueError(f"Invalid command: {command}")
+
+        # 2. Tạo match
+        match = parser.OFPMatch(**spec.get('match', {}))
+
+        # 3. Tạo actions
+        actions = []
+        for act in spec.get('actions', []):
+            atype = act.get('type')
+            if atype == 'output':
+                actions.append(parser.OFPActionOutput(int(act['port'])))
+            elif atype == 'flood':
+                actions.append(parser.OFPActionOutput(ofp.OFPP_FLOOD))
+            elif atype == 'all':
+                actions.append(parser.OFPActionOutput(ofp.OFPP_ALL))
+            elif atype == 'set_field':
+                actions.append(parser.OFPActionSetField(**{act['field']: act['value']}))
+            elif atype == 'drop':
+                actions = []
+                break  # Không thêm gì ⇒ drop
+
+        instructions = []
+        deleting = ofp_cmd in (ofp.OFPFC_DELETE, ofp.OFPFC_DELETE_STRICT)
+        if spec.get('meter_id') is not None and not deleting:
+            instructions.append(parser.OFPInstructionMeter(int(spec['meter_id']), ofp.OFPIT_METER))
+        if actions and not deleting:
+            instructions.append(parser.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS, actions))
+
+        # 4. Tạo FlowMod
+        mod_kwargs = dict(
+            datapath=dp,
+            command=ofp_cmd,
+            priority=int(spec.get('priority', 0)),
+            match=match,
+            instructions=instructions,
+            idle_timeout=int(spec.get('idle_timeout', 0)),
+            hard_timeout=int(spec.get('hard_timeout', 0))
+        )
+
+        # Thêm out_port & out_group nếu là lệnh delete
+        if deleting:
+            mod_kwargs['out_port'] = ofp.OFPP_ANY
+            mod_kwargs['out_group'] = ofp.OFPG_ANY
+
+        return parser.OFPFlowMod(**mod_kwargs)
+
+    def _meter_mod(self, dp, spec):
+        # Meter giới hạn tốc độ (kbps), command: add, modify, delete
+        ofp = dp.ofproto
+        parser = dp.ofproto_parser
+        commands = {'add': ofp.OFPMC_ADD, 'modify': ofp.OFPMC_MODIFY, 'delete': ofp.OFPMC_DELETE}
+        command = spec.get('command', 'add')
+        if command not in commands:
+            raise ValueError(f"Invalid meter command: {command}")
+        bands = [parser.OFPMeterBandDrop(rate=int(spec['rate']), burst_size=int(spec.get('burst', 0)))]
+        flags = ofp.OFPMF_KBPS | (ofp.OFPMF_BURST if spec.get('burst') else 0)
+        return parser.OFPMeterMod(dp, command=commands[command], flags=flags,
+                                  meter_id=int(spec['meter_id']), bands=bands)
+
+    def _expand_heavy(self, dpid, spec):
+        # "heavy": "src"/"dst" thay cho match: một rule cho mỗi heavy hitter (tối đa "top")
+        # mà bộ trích đặc trưng flow của Ryu đang theo dõi trên switch này
+        side = spec.get('heavy')
+        if side not in ('src', 'dst'):
+            return [spec]
+        hitters = self.switch_app.flow_features.heavy_hitters(dpid)[side][:int(spec.get('top', 3))]
+        return [dict(spec, match=dict(spec.get('match', {}), **heavy_match(side, addr)))
+                for addr, _ in hitters if addr is not None]
+
+    @route('metrics', URL_METRICS, methods=['GET'])
+    def metrics_handler(self, req, **kwargs):
+        return Response(content_type=CONTENT_TYPE, body=REGISTRY.render())
+
     @route('flowmod', URL_FLOWMOD, methods=['POST'])
     def flowmod_handler(self, req, **kwargs):
         try:
             # 1. Lấy dữ liệu từ request
             body = req.json_body
             dpid = int(body['dpid'])
-            command = body.get('command', 'add')  # add, modify, delete
-            strict = body.get('strict', False)
-            match_fields = body.get('match', {})
-            actions_spec = body.get('actions', [])
-            priority = int(body.get('priority', 0))
 
             dp = self.switch_app.datapaths.get(dpid)
             if not dp:
                 return Response(status=404, content_type='application/json; charset=utf-8',
                                 body=json.dumps({'error': f"Switch {dpid} not found"}))
 
-            ofp = dp.ofproto
-            parser = dp.ofproto_parser
-
-            # 2. Map lệnh
-            if command == 'add':
-                ofp_cmd = ofp.OFPFC_ADD
-            elif command == 'modify':
-                ofp_cmd = ofp.OFPFC_MODIFY_STRICT if strict else ofp.OFPFC_MODIFY
-            elif command == 'delete':
-                ofp_cmd = ofp.OFPFC_DELETE_STRICT if strict else ofp.OFPFC_DELETE
-            else:
+            # 2. Tạo FlowMod
+            try:
+                mod = self._flow_mod(dp, body)
+            except ValueError as e:
                 return Response(status=400, content_type='application/json; charset=utf-8',
-                                body=json.dumps({'error': f"Invalid command: {command}"}))
-
-            # 3. Tạo match
-            match = parser.OFPMatch(**match_fields)
-
-            # 4. Tạo actions
-            actions = []
-            for act in actions_spec:
-                atype = act.get('type')
-                if atype == 'output':
-                    actions.append(parser.OFPActionOutput(int(act['port'])))
-                elif atype == 'flood':
-                    actions.append(parser.OFPActionOutput(ofp.OFPP_FLOOD))
-                elif atype == 'all':
-                    actions.append(parser.OFPActionOutput(ofp.OFPP_ALL))
-                elif atype == 'set_field':
-                    actions.append(parser.OFPActionSetField(**{act['field']: act['value']}))
-                elif atype == 'drop':
-                    actions = []
-                    break  # Không thêm gì ⇒ drop
-
-            instructions = []
-            if actions and ofp_cmd != ofp.OFPFC_DELETE and ofp_cmd != ofp.OFPFC_DELETE_STRICT:
-                instructions = [parser.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS, actions)]
-
-            # 5. Tạo FlowMod
-            mod_kwargs = dict(
-                datapath=dp,
-                command=ofp_cmd,
-                priority=priority,
-                match=match,
-                instructions=instructions
-            )
-
-            # Thêm out_port & out_group nếu là lệnh delete
-            if ofp_cmd in (ofp.OFPFC_DELETE, ofp.OFPFC_DELETE_STRICT):
-                mod_kwargs['out_port'] = ofp.OFPP_ANY
-                mod_kwargs['out_group'] = ofp.OFPG_ANY
-
-            mod = parser.OFPFlowMod(**mod_kwargs)
+                                body=json.dumps({'error': str(e)}))
             dp.send_msg(mod)
 
             return Response(content_type='application/json; charset=utf-8',
                             body=json.dumps({
                                 'status': 'ok',
                                 'dpid': dpid,
-                                'command': command,
-                                'strict': strict,
-                                'match': match_fields,
-                                'actions': actions_spec
+                                'command': body.get('command', 'add'),
+                                'strict': body.get('strict', False),
+                                'match': body.get('match', {}),
+                                'actions': body.get('actions', [])
                             }, indent=2))
         except Exception as e:
             return Response(status=500, content_type='application/json; charset=utf-8',
                             body=json.dumps({'error': str(e)}))
 
+    @route('flowmod_batch', URL_FLOWMOD_BATCH, methods=['POST'])
+    def flowmod_batch_handler(self, req, **kwargs):
+        # Nhiều FlowMod/MeterMod trong một lần gọi:
+        #   {"mods": [{"dpid", ...như /flowmod}], "meters": [{"dpid", "meter_id", "rate", ...}], "timeout"}
+        # Mỗi datapath nhận toàn bộ meter rồi flow của nó, kết thúc bằng một BarrierRequest;
+        # phản hồi barrier xác nhận switch đã xử lý xong, lỗi OpenFlow được trả theo xid.
+        try:
+            body = req.json_body
+            timeout = float(body.get('timeout', REPLY_TIMEOUT))
+            by_dpid = {}
+            for kind in ('meters', 'mods'):
+                for spec in body.get(kind, []):
+                    dpid = int(spec['dpid'])
+                    by_dpid.setdefault(dpid, []).extend((kind, item) for item in self._expand_heavy(dpid, spec))
+
+            results = {}
+            missing = []
+            barriers = {}
+            for dpid, specs in by_dpid.items():
+                dp = self.switch_app.datapaths.get(dpid)
+                if not dp:
+                    missing.append(dpid)
+                    continue
+                xids = []
+                invalid = []
+                for kind, spec in specs:
+                    try:
+                        msg = self._meter_mod(dp, spec) if kind == 'meters' else self._flow_mod(dp, spec)
+                    except (ValueError, KeyError, TypeError) as e:
+                        invalid.append(str(e))
+                        continue
+                    dp.set_xid(msg)
+                    dp.send_msg(msg)
+                    xids.append(msg.xid)
+                results[dpid] = {'sent': len(xids), 'invalid': invalid, 'xids': xids}
+                barrier = self.switch_app.replies.send_request(dp, dp.ofproto_parser.OFPBarrierRequest(dp))
+                barriers[barrier] = dpid
+
+            for barrier, data in self.switch_app.replies.wait_all(barriers, timeout).items():
+                dpid = barriers[barrier]
+                result = results[dpid]
+                xids = result.pop('xids')
+                result['confirmed'] = data is not None
+                result['errors'] = self.switch_app.pop_errors(dpid, xids)
+
+            return Response(content_type='application/json; charset=utf-8',
+                            body=json.dumps({'results': results, 'missing': missing}))
+        except Exception as e:
+            return Response(status=500, content_type='application/json; charset=utf-8',
+                            body=json.dumps({'error': str(e)}))
+
     @route('flowstats', URL_FLOWSTATS, methods=['POST'])
     def get_flow_stats(self, req, **kwargs):
         try:
@@ -109,21 +236,14 @@ class SwitchRestController(ControllerBase):
                 return Response(status=404, content_type='application/json; charset=utf-8',
                                 body=json.dumps({'error': f"Switch {dpid} not found"}))
 
-            # 2. Gửi FlowStatsRequest
-            ofp = dp.ofproto
+            # 2. Gửi FlowStatsRequest và 3. Chờ phản hồi
             parser = dp.ofproto_parser
             req_msg = parser.OFPFlowStatsRequest(dp)
-            dp.send_msg(req_msg)
-
-            # 3. Chờ phản hồi
-            event = threading.Event()
-            self.switch_app._waiting_reply[dpid] = {'event': event, 'data': None}
-            if not event.wait(timeout=2):
+            stats = self.switch_app.replies.request(dp, req_msg, REPLY_TIMEOUT)
+            if stats is None:
                 return Response(status=504, content_type='application/json; charset=utf-8',
                                 body=json.dumps({'error': 'Timeout waiting for reply'}))
 
-            stats = self.switch_app._waiting_reply[dpid]['data']
-
             # 4. Trả kết quả
             return Response(content_type='application/json; charset=utf-8',
                             body=json.dumps({'dpid': dpid, 'flow_stats': stats}, indent=2))
@@ -144,15 +264,10 @@ class SwitchRestController(ControllerBase):
 
             parser = dp.ofproto_parser
             req_msg = parser.OFPPortStatsRequest(dp, 0, dp.ofproto.OFPP_ANY)
-            dp.send_msg(req_msg)
-
-            event = threading.Event()
-            self.switch_app._waiting_reply[dpid] = {'event': event, 'data': None}
-            if not event.wait(timeout=2):
+            stats = self.switch_app.replies.request(dp, req_msg, REPLY_TIMEOUT)
+            if stats is None:
                 return Response(status=504, content_type='application/json; charset=utf-8',
                                 body=json.dumps({'error': 'Timeout waiting for reply'}))
-
-            stats = self.switch_app._waiting_reply[dpid]['data']
             return Response(content_type='application/json; charset=utf-8',
                             body=json.dumps({'dpid': dpid, 'port_stats': stats}, indent=2))
 
@@ -172,18 +287,41 @@ class SwitchRestController(ControllerBase):
 
             parser = dp.ofproto_parser
             req_msg = parser.OFPTableStatsRequest(dp)
-            dp.send_msg(req_msg)
-
-            event = threading.Event()
-            self.switch_app._waiting_reply[dpid] = {'event': event, 'data': None}
-            if not event.wait(timeout=2):
+            stats = self.switch_app.replies.request(dp, req_msg, REPLY_TIMEOUT)
+            if stats is None:
                 return Response(status=504, content_type='application/json; charset=utf-8',
                                 body=json.dumps({'error': 'Timeout waiting for reply'}))
-
-            stats = self.switch_app._waiting_reply[dpid]['data']
             return Response(content_type='application/json; charset=utf-8',
                             body=json.dumps({'dpid': dpid, 'table_stats': stats}, indent=2))
 
         except Exception as e:
             return Response(status=500, content_type='application/json; charset=utf-8',
                             body=json.dumps({'error': str(e)}))
+
+    @route('flowstats_batch', URL_FLOWSTATS_BATCH, methods=['POST'])
+    def get_flow_stats_batch(self, req, **kwargs):
+        try:
+            return self._collect_stats(
+                req, lambda dp: dp.ofproto_parser.OFPFlowStatsRequest(dp), 'flow_stats')
+        except Exception as e:
+            return Response(status=500, content_type='application/json; charset=utf-8',
+                            body=json.dumps({'error': str(e)}))
+
+    @route('portstats_batch', URL_PORTSTATS_BATCH, methods=['POST'])
+    def get_port_stats_batch(self, req, **kwargs):
+        try:
+            return self._collect_stats(
+                req, lambda dp: dp.ofproto_parser.OFPPortStatsRequest(dp, 0, dp.ofproto.OFPP_ANY),
+                'port_stats')
+        except Exception as e:
+            return Response(status=500, content_type='application/json; charset=utf-8',
+                            body=json.dumps({'error': str(e)}))
+
+    @route('tablestats_batch', URL_TABLESTATS_BATCH, methods=['POST'])
+    def get_table_stats_batch(self, req, **kwargs):
+        try:
+            return self._collect_stats(
+                req, lambda dp: dp.ofproto_parser.OFPTableStatsRequest(dp), 'table_stats')
+        except Exception as e:
+            return Response(status=500, content_type='application/json; charset=utf-8',
+                            body=json.dumps({'error': str(e)}))
@@ -0,0 +1,78 @@
+import numpy as np
+
+STATUSES = ['collecting', 'train', 'normal', 'warning', 'error']
+STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+
+
+class RingBuffer(object):
+    # Bộ đệm vòng kích thước cố định: mảng float64 liên tục + chỉ số head,
+    # kèm mảng thời gian, mã trạng thái và cờ bất thường cho từng cột thực thể.
+    # Không cấp phát lại khi thêm mẫu, đọc dữ liệu huấn luyện không cần sao chép.
+
+    def __init__(self, capacity, width, columns=None, n_flags=0, seq=0):
+        self.capacity = capacity
+        self.width = width
+        self.columns = list(columns) if columns is not None else None
+        self.data = np.zeros((capacity, width), dtype=np.float64)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.status = np.zeros(capacity, dtype=np.int8)
+        self.flags = np.zeros((capacity, n_flags), dtype=bool)
+        self.head = 0   # Vị trí sẽ ghi tiếp theo
+        self.count = 0  # Số dòng hợp lệ
+        self.seq = seq  # Số thứ tự của dòng sẽ ghi tiếp theo, tiếp nối qua các bộ đệm
+
+    def __len__(self):
+        return self.count
+
+    def append(self, row, timestamp, status='collecting', flags=None):
+        i = self.head
+        self.data[i] = row
+        self.timestamps[i] = timestamp
+        self.status[i] = STATUS_CODES[status]
+        if self.flags.shape[1]:
+            self.flags[i] = False if flags is None else flags
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.seq += 1
+        return i
+
+    def set_status(self, i, status, flags=None):
+        self.status[i] = STATUS_CODES[status]
+        if flags is not None:
+            self.flags[i] = flags
+
+    def values(self):
+        # View không sao chép của mọi dòng hợp lệ; khi đã quay vòng thì thứ tự
+        # không theo thời gian, không ảnh hưởng tới việc huấn luyện scaler/GMM
+        return self.data[:self.count]
+
+    def _order(self):
+        start = (self.head - self.count) % self.capacity
+        return (start + np.arange(self.count)) % self.capacity
+
+    def ordered(self):
+        # Dữ liệu theo thứ tự thời gian; chỉ sao chép khi vùng dữ liệu bị quay vòng
+        start = (self.head - self.count) % self.capacity
+        if start + self.count <= self.capacity:
+            return self.data[start:start + self.count]
+        return self.data[self._order()]
+
+    def remap(self, columns, width_per_column):
+        # Bộ đệm mới theo bố cục cột mới, giữ nguyên lịch sử: cột cũ được chép sang
+        # đúng chỗ mới, cột chưa có trong lịch sử là 0
+        columns = list(columns)
+        new = RingBuffer(self.capacity, width_per_column * len(columns), columns,
+                         n_flags=len(columns) if self.flags.shape[1] else 0, seq=self.seq)
+        position = {key: j for j, key in enumerate(columns)}
+        pairs = [(j, position[key]) for j, key in enumerate(self.columns or []) if key in position]
+        if pairs:
+            old_idx, new_idx = (np.array(p) for p in zip(*pairs))
+            offsets = np.arange(width_per_column)
+            new.data[:, (new_idx[:, None] * width_per_column + offsets).ravel()] = \
+                self.data[:, (old_idx[:, None] * width_per_column + offsets).ravel()]
+            if self.flags.shape[1]:
+                new.flags[:, new_idx] = self.flags[:, old_idx]
+        new.timestamps[:] = self.timestamps
+        new.status[:] = self.status
+        new.head, new.count = self.head, self.count
+        return new
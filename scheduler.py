@@ -0,0 +1,113 @@
+import threading
+import numpy as np
+from flowFeatures import is_flow_column
+
+
+class AdaptiveScheduler(object):
+    # Mỗi switch có chu kỳ thăm dò riêng trong [min_interval, max_interval]:
+    #   - điểm bất thường (1 - p_normal) đẩy chu kỳ về min ngay lập tức, rồi giảm dần khi yên;
+    #   - hệ số biến thiên của tốc độ byte cũng làm tăng nhịp thăm dò;
+    #   - tổng số yêu cầu mỗi giây không vượt budget (giãn đều mọi chu kỳ khi quá tải).
+    # Switch chưa tới lượt giữ nguyên tốc độ đo lần trước trong mẫu của tick (fill).
+
+    def __init__(self, tick, min_interval, max_interval, budget, alpha=0.1, cv_high=1.0, score_high=0.5):
+        self.tick = tick
+        self.min_interval = max(min_interval, tick)
+        self.max_interval = max(max_interval, self.min_interval)
+        self.budget = budget
+        self.alpha = alpha
+        self.cv_high = cv_high
+        self.score_high = score_high
+        self._lock = threading.Lock()
+        self.state = {}       # dpid -> {'interval', 'last_poll', 'score', 'mean', 'var'}
+        self.last_rates = {}  # "dpid-port" -> tốc độ đo gần nhất
+
+    def _state(self, dpid):
+        st = self.state.get(dpid)
+        if st is None:
+            # Switch mới: chưa biết gì, thăm dò nhanh nhất
+            st = self.state[dpid] = {'interval': self.min_interval, 'last_poll': None,
+                                     'score': 0.0, 'mean': 0.0, 'var': 0.0}
+        return st
+
+    def due(self, dpids, now):
+        # Các switch tới lượt trong tick này, ưu tiên switch trễ nhiều nhất nếu vượt budget
+        with self._lock:
+            ready = []
+            for dpid in dpids:
+                st = self._state(str(dpid))
+                if st['last_poll'] is None:
+                    ready.append((float('inf'), dpid))
+                    continue
+                overdue = (now - st['last_poll']) / st['interval']
+                if overdue >= 1 - 0.5 * self.tick / st['interval']:
+                    ready.append((overdue, dpid))
+            limit = max(1, int(self.budget * self.tick))
+            if len(ready) > limit:
+                ready.sort(key=lambda r: r[0], reverse=True)
+                ready = ready[:limit]
+            for _, dpid in ready:
+                self.state[str(dpid)]['last_poll'] = now
+            return [dpid for _, dpid in ready]
+
+    def observe(self, deltas):
+        # Ghi nhận tốc độ vừa đo, cập nhật trung bình/phương sai EWMA của tốc độ byte mỗi switch
+        totals = {}
+        for key, rates in deltas.items():
+            self.last_rates[key] = rates
+            if is_flow_column(key):
+                continue
+            dpid = key.split('-', 1)[0]
+            totals[dpid] = totals.get(dpid, 0.0) + rates[2] + rates[3]
+        with self._lock:
+            for dpid, total in totals.items():
+                st = self._state(dpid)
+                diff = total - st['mean']
+                st['mean'] += self.alpha * diff
+                st['var'] = (1 - self.alpha) * (st['var'] + self.alpha * diff * diff)
+            self._retune()
+
+    def forget(self, dpid=None, keys=()):
+        # Switch chết hoặc cổng bị xóa: không thăm dò, không điền tốc độ cũ nữa
+        with self._lock:
+            if dpid is not None:
+                self.state.pop(str(dpid), None)
+            for key in keys:
+                self.last_rates.pop(key, None)
+
+    def fill(self):
+        # Mẫu đầy đủ của tick: tốc độ mới nhất của mọi cổng đã biết
+        return dict(self.last_rates)
+
+    def report(self, columns, anomaly):
+        # Điểm bất thường từng cột (0..1) của tick vừa chấm; switch lấy điểm cao nhất của các cột
+        scores = {}
+        for key, a in zip(columns, np.asarray(anomaly, dtype=float)):
+            dpid = key.split('-', 1)[0]
+            scores[dpid] = max(scores.get(dpid, 0.0), float(a))
+        with self._lock:
+            for dpid, a in scores.items():
+                # Switch đã bị forget (mất kết nối) không được tạo lại ở đây
+                st = self.state.get(dpid)
+                if st is None:
+                    continue
+                # Tăng ngay khi bất thường, giảm dần khi yên
+                st['score'] = max(a, st['score'] * (1 - self.alpha))
+            self._retune()
+
+    def _retune(self):
+        ratio = self.min_interval / self.max_interval
+        for st in self.state.values():
+            cv = np.sqrt(st['var']) / (abs(st['mean']) + 1e-9)
+            urgency = min(1.0, max(st['score'] / self.score_high, cv / self.cv_high))
+            st['interval'] = self.max_interval * ratio ** urgency
+
+        demand = sum(1 / st['interval'] for st in self.state.values())
+        scale = max(1.0, demand / self.budget) if self.budget else 1.0
+        for st in self.state.values():
+            interval = min(st['interval'] * scale, self.max_interval)
+            st['interval'] = max(self.tick, round(interval / self.tick) * self.tick)
+
+    def schedule(self):
+        with self._lock:
+            return {dpid: st['interval'] for dpid, st in self.state.items()}
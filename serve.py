@@ -0,0 +1,82 @@
+import os
+import sys
+import signal
+import argparse
+import multiprocessing
+
+# Chạy production:
+#   - một tiến trình collector duy nhất (lấy mẫu + huấn luyện), nhận /switch, /samples
+#     trên cổng nội bộ và ghi snapshot sau mỗi tick;
+#   - N worker API sau gunicorn (hoặc waitress nếu không có gunicorn) phục vụ dashboard
+#     bằng cách đọc snapshot, mở rộng độc lập với collector.
+# Ryu nên gửi thẳng tới collector: SDN_APP_DOMAIN=http://127.0.0.1:<collector-port>
+
+COLLECTOR_STOP_TIMEOUT = 10  # Thời gian chờ collector dừng trước khi buộc kết thúc (giây)
+
+
+def run_collector(host, port):
+    os.environ['SDN_ROLE'] = 'collector'
+    # SIGTERM từ tiến trình chính: thoát bình thường để các tiến trình con (shard,
+    # trainer, chọn mô hình) cũng được dừng theo
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    import app as sdn
+    if not sdn.start_collector():
+        sys.exit(1)
+    from waitress import serve
+    serve(sdn.app, host=host, port=port, threads=8)
+
+
+def run_api(host, port, workers):
+    os.environ['SDN_ROLE'] = 'api'
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        # Không có gunicorn: một tiến trình waitress nhiều luồng
+        import app as sdn
+        from waitress import serve
+        serve(sdn.app, host=host, port=port, threads=4 * workers)
+        return
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{host}:{port}")
+            self.cfg.set('workers', workers)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', 8)
+            # Luồng SSE giữ kết nối lâu, không để gunicorn coi là treo
+            self.cfg.set('timeout', 0)
+
+        def load(self):
+            import app as sdn
+            return sdn.app
+
+    Server().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the SDN-GMM dashboard with a singleton collector")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=max(2, multiprocessing.cpu_count()))
+    parser.add_argument('--collector-host', default='127.0.0.1')
+    parser.add_argument('--collector-port', type=int, default=5001)
+    args = parser.parse_args()
+
+    os.environ['SDN_COLLECTOR_URL'] = f"http://{args.collector_host}:{args.collector_port}"
+    # Không daemon: collector cần tạo tiến trình con (shard, trainer, chọn mô hình),
+    # nên phải được dừng tường minh khi thoát
+    collector = multiprocessing.Process(target=run_collector, args=(args.collector_host, args.collector_port),
+                                        name='collector')
+    collector.start()
+    try:
+        run_api(args.host, args.port, args.workers)
+    finally:
+        collector.terminate()
+        collector.join(COLLECTOR_STOP_TIMEOUT)
+        if collector.is_alive():
+            collector.kill()
+            collector.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+import bisect
+import hashlib
+import queue
+import threading
+import time
+import logging
+import multiprocessing
+import requests
+from rates import counter_rates, port_duration
+
+VNODES = 64  # Số nút ảo cho mỗi shard trên vòng băm
+log = logging.getLogger('sdn')
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing(object):
+    # Băm nhất quán dpid lên các shard: thêm/bớt shard chỉ di chuyển ~1/N số switch
+
+    def __init__(self, n_shards, vnodes=VNODES):
+        points = sorted((_hash(f"shard-{shard}-{v}"), shard) for shard in range(n_shards) for v in range(vnodes))
+        self._keys = [p[0] for p in points]
+        self._shards = [p[1] for p in points]
+
+    def shard_for(self, dpid):
+        i = bisect.bisect(self._keys, _hash(str(dpid))) % len(self._keys)
+        return self._shards[i]
+
+
+def shard_main(index, base_url, t_sampling, deadline, control, results):
+    # Tiến trình shard: mỗi tick (căn theo đồng hồ chung) lấy portstats của các switch
+    # được giao qua route batch của Ryu, tính tốc độ mỗi giây và gửi về bộ ghép
+    http = requests.Session()
+    groups = {}  # URL controller (None: base_url) -> các dpid được giao
+    prev_features = {}  # "dpid-port" -> (bộ đếm, duration) lần trước
+    tick = int(time.time() // t_sampling) + 1
+    while True:
+        delay = tick * t_sampling - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            tick = int(time.time() // t_sampling)
+
+        try:
+            while True:
+                groups = control.get_nowait()
+        except queue.Empty:
+            pass
+
+        deltas = {}
+        for url, dpids in groups.items():
+            try:
+                received = time.time()
+                res = http.post(f"{url or base_url}/portstats", json={"dpids": [int(d) for d in dpids], "timeout": deadline},
+                                timeout=deadline + 0.5)
+                for dpid, ports in res.json().get("port_stats", {}).items():
+                    for port in ports:
+                        port_no = port.get("port_no")
+                        if port_no == 4294967294:
+                            continue
+                        key = f"{dpid}-{port_no}"
+                        stats = [port.get("rx_packets", 0), port.get("tx_packets", 0),
+                                 port.get("rx_bytes", 0), port.get("tx_bytes", 0)]
+                        duration = port_duration(port, received)
+                        prev = prev_features.get(key)
+                        prev_features[key] = (stats, duration)
+                        deltas[key] = counter_rates(stats, duration, prev)
+            except Exception as e:
+                log.error(f"Shard {index} collecting stats from {url or base_url}: {e}")
+
+        results.put((tick, index, deltas))
+        tick += 1
+
+
+class TickMerger(object):
+    # Ghép các phần delta cùng tick (tick id = time // t_sampling) từ nhiều nguồn (shard,
+    # controller) thành một mẫu toàn cục. Tick được phát theo thứ tự khi đủ mọi nguồn
+    # mong đợi hoặc khi đã quá hạn chót; phần tới sau khi tick đã phát bị bỏ.
+
+    def __init__(self, t_sampling, deadline, grace, on_sample):
+        self.t_sampling = t_sampling
+        self.deadline = deadline
+        self.grace = grace
+        self.on_sample = on_sample
+        self.pending = {}   # tick -> {nguồn: deltas}
+        self.last_tick = -1
+        self._lock = threading.Lock()
+
+    def add(self, tick, source, deltas):
+        with self._lock:
+            if tick <= self.last_tick:
+                return False
+            self.pending.setdefault(tick, {})[source] = deltas
+            return True
+
+    def flush(self, expected, now=None):
+        # expected: tập nguồn cần chờ cho mỗi tick
+        now = time.time() if now is None else now
+        ready = []
+        with self._lock:
+            for tick in sorted(self.pending):
+                parts = self.pending[tick]
+                if not set(expected) <= set(parts) and now < tick * self.t_sampling + self.deadline + self.grace:
+                    break
+                del self.pending[tick]
+                self.last_tick = tick
+                ready.append((tick, parts))
+        for tick, parts in ready:
+            merged = {}
+            for part in parts.values():
+                merged.update(part)
+            self.on_sample(merged, tick * self.t_sampling)
+
+
+class ShardedCollector(object):
+    # Chia switch cho N tiến trình shard, ghép kết quả cùng tick thành một mẫu toàn cục
+
+    def __init__(self, n_shards, base_url, t_sampling, deadline, grace, on_sample):
+        self.n_shards = n_shards
+        self.t_sampling = t_sampling
+        self.ring = HashRing(n_shards)
+        self.merger = TickMerger(t_sampling, deadline, grace, on_sample)
+        # 'spawn': shard không thừa hưởng luồng và khóa của tiến trình chính như khi fork
+        ctx = multiprocessing.get_context('spawn')
+        self.results = ctx.Queue()
+        self.controls = [ctx.Queue() for _ in range(n_shards)]
+        self.assigned = [None] * n_shards
+        self.processes = [
+            ctx.Process(target=shard_main, name=f"shard-{i}",
+                        args=(i, base_url, t_sampling, deadline, self.controls[i], self.results),
+                        daemon=True)
+            for i in range(n_shards)
+        ]
+
+    def start(self):
+        for p in self.processes:
+            p.start()
+        threading.Thread(target=self._merge_loop, name='shard-merger', daemon=True).start()
+
+    def assign(self, dpids, url_for=None):
+        # url_for(dpid) -> URL REST của controller quản lý switch (nhiều controller)
+        groups = [{} for _ in range(self.n_shards)]
+        for dpid in dpids:
+            url = url_for(dpid) if url_for is not None else None
+            groups[self.ring.shard_for(dpid)].setdefault(url, []).append(dpid)
+        for i, group in enumerate(groups):
+            if group != self.assigned[i]:
+                self.assigned[i] = group
+                self.controls[i].put(group)
+
+    def _merge_loop(self):
+        expected = range(self.n_shards)
+        while True:
+            try:
+                tick, shard, deltas = self.results.get(timeout=self.t_sampling / 4)
+                if not self.merger.add(tick, shard, deltas):
+                    log.warning(f"Shard {shard} result for tick {tick} arrived after merge, dropped")
+            except queue.Empty:
+                pass
+            self.merger.flush(expected)
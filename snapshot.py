@@ -0,0 +1,79 @@
+import os
+import json
+import fcntl
+import threading
+
+
+class SnapshotWriter(object):
+    # Tiến trình collector ghi trạng thái công khai ra một file và thay thế nguyên tử
+    # (os.replace), worker API đọc không cần khóa. Dòng đầu là header JSON, mỗi dòng
+    # sau là một bản ghi đã mã hóa sẵn nên worker không phải parse lại.
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Luồng request và luồng lấy mẫu cùng ghi: tuần tự hóa để không ghi đè file tạm
+        # của nhau; RLock để người gọi giữ khóa cả lúc đọc trạng thái cần ghi
+        self.lock = threading.RLock()
+
+    def write(self, published_seq, rows, dpids, sampling):
+        header = json.dumps({'published_seq': published_seq, 'dpids': dpids, 'sampling': sampling})
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with self.lock:
+            with open(tmp, 'w') as f:
+                f.write(header)
+                for row in rows:
+                    f.write('\n')
+                    f.write(row)
+            os.replace(tmp, self.path)
+
+
+class SnapshotReader(object):
+    # Chỉ đọc lại file khi nó thay đổi (so sánh mtime)
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.header = {'published_seq': 0, 'dpids': [], 'sampling': False}
+        self.rows = []
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return self
+        if mtime == self._mtime:
+            return self
+        with self._lock:
+            if mtime != self._mtime:
+                with open(self.path) as f:
+                    lines = f.read().split('\n')
+                self.header, self.rows = json.loads(lines[0]), lines[1:]
+                self._mtime = mtime
+        return self
+
+    @property
+    def published_seq(self):
+        return self.header['published_seq']
+
+    def rows_since(self, since):
+        header, rows = self.header, self.rows
+        end = header['published_seq']
+        first = end - len(rows)
+        return rows[max(since - first, 0):], end
+
+
+def acquire_singleton(path):
+    # Khóa file độc quyền, không chờ: chỉ một tiến trình collector được chạy.
+    # Trả về file đang giữ khóa (phải giữ tham chiếu), hoặc None nếu đã có collector khác.
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    f = open(path, 'w')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    f.write(str(os.getpid()))
+    f.flush()
+    return f
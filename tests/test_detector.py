@@ -0,0 +1,109 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('sklearn')
+
+from sklearn.mixture import GaussianMixture
+import detector
+from detector import Detector, OnlineGMM, log_normalize, weighted_log_prob, full_covariances
+
+COVARIANCE_TYPES = ['full', 'tied', 'diag', 'spherical']
+
+
+def mixture(seed=0, n=300):
+    rng = np.random.RandomState(seed)
+    return np.vstack([rng.normal(0, 1, size=(n // 2, 3)), rng.normal(4, 0.5, size=(n - n // 2, 3))])
+
+
+def fitted(cov_type, X, **kwargs):
+    return GaussianMixture(n_components=2, covariance_type=cov_type, random_state=0, reg_covar=1e-4,
+                           **kwargs).fit(X)
+
+
+@pytest.mark.parametrize('cov_type', COVARIANCE_TYPES)
+def test_weighted_log_prob_matches_sklearn(cov_type):
+    X = mixture()
+    gmm = fitted(cov_type, X)
+    log_likelihood, log_resp = log_normalize(weighted_log_prob(gmm, X))
+    np.testing.assert_allclose(log_likelihood, gmm.score_samples(X), rtol=1e-8, atol=1e-8)
+    np.testing.assert_allclose(np.exp(log_resp), gmm.predict_proba(X), atol=1e-8)
+
+
+@pytest.mark.parametrize('cov_type', COVARIANCE_TYPES)
+def test_partial_fit_full_step_matches_one_sklearn_em_iteration(cov_type, monkeypatch):
+    # Bước học 1 (lần cập nhật đầu với step_offset=1) là một vòng EM đầy đủ trên lô
+    monkeypatch.setattr(detector, 'FACTOR_EVERY', 1)
+    X = mixture()
+    start = fitted(cov_type, X[:100], max_iter=5)
+    online = OnlineGMM(fitted(cov_type, X[:100], max_iter=5), reg_covar=1e-4, step_offset=1)
+    online.partial_fit(X)
+
+    reference = GaussianMixture(n_components=2, covariance_type=cov_type, reg_covar=1e-4, max_iter=1,
+                                weights_init=start.weights_, means_init=start.means_,
+                                precisions_init=start.precisions_)
+    with pytest.warns(Warning):
+        reference.fit(X)  # Một vòng không hội tụ
+    np.testing.assert_allclose(online.gmm.weights_, reference.weights_, rtol=1e-6)
+    np.testing.assert_allclose(online.gmm.means_, reference.means_, rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(online.gmm.covariances_, reference.covariances_, rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(online.gmm.precisions_cholesky_, reference.precisions_cholesky_, rtol=1e-6)
+
+
+@pytest.mark.parametrize('cov_type', ['full', 'diag'])
+def test_remap_follows_affine_change_of_coordinates(cov_type):
+    # z' = A z + b: mean đổi theo A mu + b, hiệp phương sai theo A Sigma A^T
+    X = mixture()
+    gmm = fitted(cov_type, X)
+    means, covariances = gmm.means_.copy(), full_covariances(gmm).copy()
+    online = OnlineGMM(gmm, reg_covar=0.0)
+    A = np.array([2.0, 0.5, 1.5])
+    b = np.array([1.0, -2.0, 0.25])
+    online.remap(A, b)
+    np.testing.assert_allclose(gmm.means_, means * A + b, rtol=1e-10)
+    np.testing.assert_allclose(full_covariances(gmm), covariances * np.outer(A, A), rtol=1e-8, atol=1e-12)
+
+    if cov_type == 'full':
+        rotation = np.linalg.qr(np.random.RandomState(1).normal(size=(3, 3)))[0]
+        means, covariances = gmm.means_.copy(), gmm.covariances_.copy()
+        online.remap(rotation, b)
+        np.testing.assert_allclose(gmm.means_, means @ rotation.T + b, rtol=1e-8, atol=1e-10)
+        np.testing.assert_allclose(gmm.covariances_, rotation @ covariances @ rotation.T, rtol=1e-8, atol=1e-10)
+
+
+def test_scaler_update_keeps_raw_density(monkeypatch):
+    # Detector.partial_fit đổi scaler và biểu diễn lại thống kê EM: mật độ theo đơn vị gốc
+    # (log-likelihood chuẩn hóa trừ log|scale|) của mẫu cũ không đổi khi bước học ~0
+    monkeypatch.setattr(detector, 'FACTOR_EVERY', 1)
+    X = mixture() * 10 + 50
+    model = Detector(n_components=2, covariance_type='full').fit(X)
+    before = model.score_batch(X[:20])[2] - np.log(model.scaler.scale_).sum()
+    model.online.step_offset = 1e12
+    model.partial_fit(X[:5] + 300.0)
+    after = model.score_batch(X[:20])[2] - np.log(model.scaler.scale_).sum()
+    np.testing.assert_allclose(after, before, rtol=1e-3)
+
+
+@pytest.mark.parametrize('projection', [None, 'ipca', 'random'])
+def test_save_load_round_trip(tmp_path, projection):
+    X = mixture(n=200) * 10 + 50
+    X = np.hstack([X, X[:, :1] * 2])
+    model = Detector(n_components=2, projection=projection, projection_dim=2).fit(X)
+    model.columns = ['1-1']
+    model.partial_fit(X[:8])
+    path = str(tmp_path / 'gmm-000001.npz')
+    model.save(path, feature_mode='global')
+
+    loaded = Detector.load(path)
+    assert loaded.columns == ['1-1']
+    assert loaded.metadata['feature_mode'] == 'global'
+    assert loaded.threshold == model.threshold
+    assert loaded.normal_component == model.normal_component
+    assert list(loaded.normal_components) == list(model.normal_components)
+    assert loaded.scaler.n_samples_seen_.shape == (X.shape[1],)
+    for got, expected in zip(loaded.score_batch(X), model.score_batch(X)):
+        np.testing.assert_allclose(got, expected)
+
+    # Cập nhật tiếp sau khi nạp cho cùng kết quả như mô hình gốc
+    model.partial_fit(X[8:40])
+    loaded.partial_fit(X[8:40])
+    np.testing.assert_allclose(loaded.score_batch(X)[2], model.score_batch(X)[2], rtol=1e-8)
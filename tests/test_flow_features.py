@@ -0,0 +1,28 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from flowFeatures import FlowFeatures, flow_record
+
+
+def records(n, packets):
+    return [flow_record(0, 1, {'in_port': 1, 'ipv4_src': f"10.0.0.{i}", 'ipv4_dst': '10.0.1.1'},
+                        packets, 1000 * packets, 10.0) for i in range(n)]
+
+
+def test_forget_drops_switch_state():
+    # Ryu cập nhật và quên switch theo dpid kiểu int: sketch, heavy hitter phải mất hết
+    features = FlowFeatures(capacity=64)
+    features.update(1, records(4, 10), 0.0)
+    features.update(1, records(4, 20), 1.0)
+    features.update(2, records(2, 10), 1.0)
+    assert features.heavy_hitters(1)['src']
+
+    features.forget(1)
+    assert 1 not in features.switches
+    assert features.heavy_hitters(1) == {'src': [], 'dst': []}
+    assert features.heavy_hitters(2)['src']
+
+    # Switch kết nối lại bắt đầu từ đầu: lần đầu không tính tốc độ flow mới
+    row = features.update(1, records(4, 30), 2.0)
+    assert row['1-flows'][1] == 0.0
@@ -0,0 +1,37 @@
+import pytest
+
+from rates import COUNTER_WRAP, counter_rates, port_duration
+
+
+def test_new_port_has_zero_rate():
+    assert counter_rates([10, 20], 5.0, None) == [0.0, 0.0]
+
+
+def test_rate_uses_switch_duration():
+    assert counter_rates([110, 400], 12.0, ([100, 200], 10.0)) == [5.0, 100.0]
+
+
+def test_same_duration_has_zero_rate():
+    # Switch trả lại thống kê cũ (duration không đổi): không chia cho 0
+    assert counter_rates([110], 10.0, ([100], 10.0)) == [0.0]
+
+
+def test_counter_wrap():
+    # uint64 tràn: delta tính qua mốc 2^64
+    assert counter_rates([5], 11.0, ([COUNTER_WRAP - 5], 10.0)) == [10.0]
+
+
+def test_cleared_counter_without_duration_reset():
+    # Bộ đếm bị xóa nhưng duration vẫn tăng: delta là giá trị mới, không phải ~2^64
+    assert counter_rates([40], 12.0, ([1000], 10.0)) == [20.0]
+
+
+def test_port_reset():
+    # duration giảm: cổng reset, bộ đếm tính lại từ 0 trong `duration` giây
+    assert counter_rates([40, 0], 4.0, ([1000, 1000], 100.0)) == [10.0, 0.0]
+    assert counter_rates([40], 0.0, ([1000], 100.0)) == [0.0]
+
+
+def test_port_duration():
+    assert port_duration({'duration_sec': 3, 'duration_nsec': 500000000}, 99.0) == pytest.approx(3.5)
+    assert port_duration({}, 99.0) == 99.0
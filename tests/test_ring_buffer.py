@@ -0,0 +1,45 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from ringBuffer import RingBuffer, STATUSES
+
+
+def filled(capacity=4, n=6):
+    buf = RingBuffer(capacity, 4, ['1-1', '1-2'], n_flags=2)
+    for i in range(n):
+        buf.append([i, i, 10 + i, 10 + i], 100.0 + i, 'normal' if i % 2 else 'warning', [i % 2 == 0, False])
+    return buf
+
+
+def test_append_wraps_and_orders():
+    buf = filled()
+    assert len(buf) == 4 and buf.seq == 6
+    np.testing.assert_array_equal(buf.ordered()[:, 0], [2, 3, 4, 5])
+
+
+def test_remap_moves_columns_and_keeps_history():
+    buf = filled()
+    new = buf.remap(['1-3', '1-2', '1-1'], 2)
+    assert new.columns == ['1-3', '1-2', '1-1']
+    assert (new.head, new.count, new.seq) == (buf.head, buf.count, buf.seq)
+    ordered = new.ordered()
+    # Cột mới là 0, cột cũ được chép đúng chỗ mới
+    np.testing.assert_array_equal(ordered[:, :2], 0)
+    np.testing.assert_array_equal(ordered[:, 2:4], buf.ordered()[:, 2:4])
+    np.testing.assert_array_equal(ordered[:, 4:6], buf.ordered()[:, 0:2])
+    np.testing.assert_array_equal(new.timestamps, buf.timestamps)
+    assert [STATUSES[s] for s in new.status] == [STATUSES[s] for s in buf.status]
+    np.testing.assert_array_equal(new.flags[:, 0], False)
+    np.testing.assert_array_equal(new.flags[:, 2], buf.flags[:, 0])
+
+    # Ghi tiếp vào bộ đệm mới theo bố cục mới
+    new.append([1, 1, 2, 2, 3, 3], 200.0, 'normal')
+    np.testing.assert_array_equal(new.ordered()[-1], [1, 1, 2, 2, 3, 3])
+
+
+def test_remap_drops_removed_columns():
+    buf = filled()
+    new = buf.remap(['1-2'], 2)
+    assert new.width == 2 and new.flags.shape == (4, 1)
+    np.testing.assert_array_equal(new.ordered(), buf.ordered()[:, 2:4])
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip('requests')
+
+from shard import HashRing, TickMerger
+
+
+def merger(t_sampling=1.0, deadline=0.5, grace=0.5):
+    samples = []
+    return TickMerger(t_sampling, deadline, grace, lambda merged, t: samples.append((t, merged))), samples
+
+
+def test_emits_when_all_sources_arrived():
+    m, samples = merger()
+    m.add(10, 0, {'1-1': [1]})
+    m.flush([0, 1], now=10.0)
+    assert samples == []
+    m.add(10, 1, {'2-1': [2]})
+    m.flush([0, 1], now=10.0)
+    assert samples == [(10.0, {'1-1': [1], '2-1': [2]})]
+
+
+def test_emits_in_order_after_deadline_and_drops_late_parts():
+    m, samples = merger()
+    m.add(11, 0, {'1-1': [3]})
+    m.add(11, 1, {'2-1': [4]})
+    m.add(10, 0, {'1-1': [1]})
+    # Tick 10 thiếu nguồn 1 giữ tick 11 lại cho tới hạn chót của tick 10
+    m.flush([0, 1], now=10.9)
+    assert samples == []
+    m.flush([0, 1], now=11.0)
+    assert [t for t, _ in samples] == [10.0, 11.0]
+    assert samples[0][1] == {'1-1': [1]}
+    assert not m.add(10, 1, {'2-1': [2]})
+    assert not m.add(11, 1, {'2-1': [2]})
+    assert m.add(12, 1, {'2-1': [2]})
+
+
+def test_hash_ring_is_stable():
+    ring = HashRing(4)
+    assert {ring.shard_for(d) for d in range(1, 200)} == set(range(4))
+    assert [ring.shard_for(d) for d in range(1, 50)] == [HashRing(4).shard_for(d) for d in range(1, 50)]
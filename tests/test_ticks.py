@@ -0,0 +1,112 @@
+import os
+import subprocess
+import sys
+import time
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('sklearn')
+pytest.importorskip('flask')
+
+import app
+from ringBuffer import STATUSES
+from topology import TopologyRegistry
+from trainer import train_detector
+
+COLUMNS = ['1-1', '1-2']
+MODES = ['global', 'port']
+
+
+@pytest.fixture
+def fresh_app(monkeypatch):
+    # Trạng thái lấy mẫu sạch, không ghi đĩa, không gửi rule
+    monkeypatch.setattr(app, 'MODEL_DIR', None)
+    monkeypatch.setattr(app, 'store', None)
+    monkeypatch.setattr(app, 'scheduler', None)
+    monkeypatch.setattr(app, 'mitigation', None)
+    monkeypatch.setattr(app, 'controller_detectors', None)
+    monkeypatch.setattr(app, 'samples', None)
+    monkeypatch.setattr(app, 'detector', None)
+    monkeypatch.setattr(app, 'topology', TopologyRegistry())
+    monkeypatch.setattr(app, 'sampling_start_time', time.time() - app.DURATION_TRAIN - 1)
+    return app
+
+
+def install(monkeypatch, mode, n_ticks=60):
+    # Mô hình huấn luyện trên lưu lượng quanh 100 ở mọi đặc trưng, cài như trainer
+    monkeypatch.setattr(app, 'FEATURE_MODE', mode)
+    rng = np.random.RandomState(0)
+    X = rng.normal(100, 5, size=(n_ticks, app.PORT_FEATURES * len(COLUMNS)))
+    if mode == 'port':
+        model = train_detector(X.reshape(-1, app.PORT_FEATURES), None, app.trainer.params, len(COLUMNS))
+    else:
+        model = train_detector(X, COLUMNS, app.trainer.params)
+    app.install_detector(model)
+    return model
+
+
+def tick(value, now, ports=COLUMNS):
+    deltas = {key: [100.0] * app.PORT_FEATURES for key in COLUMNS}
+    deltas.update({key: [value] * app.PORT_FEATURES for key in ports})
+    app.process_sample(deltas, now)
+    row = (app.samples.head - 1) % app.samples.capacity
+    return STATUSES[app.samples.status[row]]
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_installed_model_scores_next_tick(fresh_app, monkeypatch, mode):
+    model = install(monkeypatch, mode)
+    assert app.model_compatible(app.detector, COLUMNS)
+    assert tick(100.0, time.time()) == 'normal'
+    assert app.detector is model
+
+
+@pytest.mark.parametrize('mode', MODES)
+@pytest.mark.parametrize('factor', [10, 100])
+def test_spike_is_warning(fresh_app, monkeypatch, mode, factor):
+    # Tick giống dữ liệu huấn luyện là normal, một cổng tăng vọt 10-100 lần là warning
+    install(monkeypatch, mode)
+    now = time.time()
+    assert [tick(100.0, now), tick(100.0 * factor, now + 1, ['1-2']), tick(100.0, now + 2)] == \
+        ['normal', 'warning', 'normal']
+
+
+def test_port_mode_flags_only_the_spiking_port(fresh_app, monkeypatch):
+    install(monkeypatch, 'port')
+    assert tick(1000.0, time.time(), ['1-2']) == 'warning'
+    row = (app.samples.head - 1) % app.samples.capacity
+    assert app.samples.flags[row].tolist() == [False, True]
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_online_update_does_not_absorb_sustained_spike(fresh_app, monkeypatch, mode):
+    # Cập nhật online chỉ gộp tick normal: tấn công kéo dài vẫn bị báo warning
+    monkeypatch.setattr(app, 'UPDATE_MODE', 'online')
+    install(monkeypatch, mode)
+    now = time.time()
+    assert [tick(1000.0, now + i) for i in range(20)] == ['warning'] * 20
+
+
+def test_checkpoint_saved_before_model_is_published(fresh_app, monkeypatch, tmp_path):
+    # Luồng lấy mẫu chỉ thấy (và cập nhật online) mô hình sau khi checkpoint đã ghi xong
+    published = []
+    save_checkpoint = app.save_checkpoint
+
+    def save(model, *args, **kwargs):
+        published.append(app.detector is model)
+        return save_checkpoint(model, *args, **kwargs)
+
+    monkeypatch.setattr(app, 'MODEL_DIR', str(tmp_path))
+    monkeypatch.setattr(app, 'save_checkpoint', save)
+    model = install(monkeypatch, 'global')
+    assert published == [False]
+    assert app.detector is model
+    assert len(list(tmp_path.glob('gmm-*.npz'))) == 1
+
+
+def test_import_does_not_create_data_dirs(tmp_path):
+    # Nhập app (test, bench, công cụ) không được tạo thư mục data/ trong thư mục hiện tại
+    root = os.path.dirname(os.path.abspath(app.__file__))
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=str(tmp_path), check=True,
+                   env=dict(os.environ, PYTHONPATH=root))
+    assert not (tmp_path / 'data').exists()
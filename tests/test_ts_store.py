@@ -0,0 +1,55 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from tsStore import TimeSeriesStore
+
+PORT_FEATURES = 2
+
+
+def write(store, timestamps, columns, status=2):
+    for t in timestamps:
+        vector = [t + j for j in range(PORT_FEATURES * len(columns))]
+        store.append(t, status, vector, columns, [0.5] * len(columns), [0] * len(columns))
+
+
+def test_root_created_lazily(tmp_path):
+    root = tmp_path / 'store'
+    store = TimeSeriesStore(str(root), PORT_FEATURES)
+    assert not root.exists()
+    assert store.tail(5) is None and store.query() == []
+    write(store, [1.0], ['1-1'])
+    assert root.is_dir()
+
+
+def test_query_across_segments(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), PORT_FEATURES, segment_seconds=10)
+    write(store, range(0, 25), ['1-1', '2-1'])
+    store.close()
+    assert len(store.segment_paths()) == 3
+
+    parts = store.query(5, 15)
+    np.testing.assert_array_equal(np.concatenate([p['timestamp'] for p in parts]), np.arange(5, 15))
+    parts = store.query(8, 22, dpid=2)
+    assert all(p['columns'] == ['2-1'] for p in parts)
+    vector = np.concatenate([p['vector'] for p in parts])
+    np.testing.assert_array_equal(vector[:, 0], np.arange(8, 22) + 2)
+    assert np.concatenate([p['p_normal'] for p in parts]).shape == (14, 1)
+    assert store.query(30, 40) == []
+
+
+def test_tail_walks_back_over_prefix_layouts(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), PORT_FEATURES, segment_seconds=10)
+    write(store, range(0, 5), ['9-1'])           # Bố cục không tương thích: dừng ở đây
+    write(store, range(5, 12), ['1-1'])          # Phần đầu của bố cục mới, qua mốc segment
+    write(store, range(12, 15), ['1-1', '1-2'])  # Thêm cổng trong cùng segment
+
+    tail = store.tail(4)
+    assert tail['columns'] == ['1-1', '1-2']
+    np.testing.assert_array_equal(tail['timestamp'], [11, 12, 13, 14])
+    np.testing.assert_array_equal(tail['vector'][0], [11, 12, 0, 0])
+    np.testing.assert_array_equal(tail['vector'][-1], [14, 15, 16, 17])
+
+    tail = store.tail(100)
+    np.testing.assert_array_equal(tail['timestamp'], np.arange(5, 15))
+    store.close()
@@ -0,0 +1,40 @@
+import threading
+
+
+class TopologyRegistry(object):
+    # Lược đồ cột ổn định cho switch/cổng theo sự kiện của Ryu (kết nối, mất kết nối,
+    # port status): mỗi khóa "dpid-port" (hoặc cột flow) được gán chỉ số một lần theo
+    # thứ tự xuất hiện và không đổi chỗ. Cột mới luôn nối vào cuối; cột của cổng hoặc
+    # switch đã mất vẫn giữ chỗ (được điền bù) để mô hình hiện tại vẫn dùng được.
+
+    def __init__(self, columns=()):
+        self.columns = []   # Danh sách mới mỗi khi lược đồ đổi, bản cũ không bị sửa
+        self.index = {}     # khóa -> chỉ số cột
+        self._lock = threading.Lock()
+        self.extend(columns)
+
+    def extend(self, keys):
+        # Ghi nhận các cột có dữ liệu; trả về True nếu có cột mới
+        with self._lock:
+            new = [key for key in keys if key not in self.index]
+            if new:
+                columns = list(self.columns)
+                for key in new:
+                    if key not in self.index:
+                        self.index[key] = len(columns)
+                        columns.append(key)
+                self.columns = columns
+        return bool(new)
+
+    def switch_columns(self, dpid):
+        # Các cột của một switch (để dọn trạng thái khi switch mất kết nối)
+        prefix = f"{dpid}-"
+        with self._lock:
+            return [key for key in self.columns if key.startswith(prefix)]
+
+    def port_status(self, dpid, port_no, live):
+        key = f"{dpid}-{port_no}"
+        if live:
+            # Cổng mới được gán cột ngay, trước khi có dữ liệu
+            self.extend([key])
+        return key
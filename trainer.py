@@ -0,0 +1,66 @@
+import threading
+import multiprocessing
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+from detector import Detector
+from metrics import REGISTRY
+
+FIT_SECONDS = REGISTRY.histogram('sdn_fit_seconds', "Background GMM training time",
+                                 buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+log = logging.getLogger('sdn')
+
+
+def train_detector(X, columns=None, params=None, rows_per_tick=1):
+    model = Detector(**(params or {})).fit(X, rows_per_tick)
+    model.columns = columns
+    return model
+
+
+class BackgroundTrainer(object):
+    # Huấn luyện cặp scaler+GMM mới trên bản chụp dữ liệu ở luồng/tiến trình riêng,
+    # luồng lấy mẫu không bị chặn. Chỉ một lần huấn luyện chạy tại một thời điểm,
+    # các yêu cầu đến trong lúc đó được gộp lại, chỉ giữ bản chụp mới nhất.
+
+    def __init__(self, on_trained, use_processes=False, params=None):
+        self.on_trained = on_trained
+        self.params = params or {}
+        if use_processes:
+            # 'spawn': tiến trình con không thừa hưởng luồng và khóa của tiến trình chính như khi fork
+            self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trainer')
+        self._lock = threading.RLock()
+        self._running = None
+        self._pending = None
+
+    def submit(self, X, columns=None, rows_per_tick=1):
+        snapshot = (np.array(X, dtype=float), list(columns) if columns is not None else None, rows_per_tick)
+        with self._lock:
+            if self._running is not None:
+                self._pending = snapshot
+                return False
+            self._start(snapshot)
+        return True
+
+    def _start(self, snapshot):
+        self._started = time.perf_counter()
+        X, columns, rows_per_tick = snapshot
+        self._running = self.executor.submit(train_detector, X, columns, self.params, rows_per_tick)
+        self._running.add_done_callback(self._done)
+
+    def _done(self, future):
+        try:
+            model = future.result()
+        except Exception as e:
+            log.error(f"Background GMM training failed: {e}")
+        else:
+            FIT_SECONDS.observe(time.perf_counter() - self._started)
+            self.on_trained(model)
+
+        with self._lock:
+            self._running = None
+            if self._pending is not None:
+                snapshot, self._pending = self._pending, None
+                self._start(snapshot)
@@ -0,0 +1,198 @@
+import os
+import json
+import numpy as np
+
+SEGMENT_SECONDS = 3600  # Mỗi segment chứa tối đa một giờ dữ liệu
+
+# Tên cột -> kiểu dữ liệu; độ rộng của từng cột lưu trong meta.json
+COLUMN_TYPES = {
+    'timestamp': '<f8',
+    'status': 'i1',
+    'vector': '<f8',    # delta của PORT_FEATURES bộ đếm cho mỗi cổng
+    'p_normal': '<f4',  # xác suất thuộc thành phần normal (toàn cục hoặc theo cổng)
+    'flags': 'u1',      # cờ bất thường theo cổng
+}
+
+
+class Segment(object):
+    # Một segment: mỗi cột là một file nhị phân chỉ ghi nối, đọc bằng memmap
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.columns = meta['columns']
+        self.widths = meta['widths']
+        self._files = {}
+
+    @classmethod
+    def create(cls, path, start, columns, widths):
+        os.makedirs(path, exist_ok=True)
+        meta = {'start': start, 'columns': list(columns), 'widths': widths}
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        return cls(path, meta)
+
+    @classmethod
+    def open(cls, path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            return cls(path, json.load(f))
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _row_bytes(self, name):
+        return np.dtype(COLUMN_TYPES[name]).itemsize * self.widths[name]
+
+    def __len__(self):
+        # Số dòng hoàn chỉnh ở mọi cột (bỏ qua dòng ghi dở khi tiến trình bị dừng)
+        n = None
+        for name in COLUMN_TYPES:
+            if self.widths[name] == 0:
+                continue
+            path = self._file(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            rows = size // self._row_bytes(name)
+            n = rows if n is None else min(n, rows)
+        return n
+
+    def append(self, **values):
+        for name, dtype in COLUMN_TYPES.items():
+            f = self._files.get(name)
+            if f is None:
+                f = self._files[name] = open(self._file(name), 'ab')
+            width = self.widths[name]
+            value = np.asarray(values[name], dtype=dtype).reshape(width if width != 1 else ())
+            f.write(value.tobytes())
+        for f in self._files.values():
+            f.flush()
+
+    def read(self, name, n=None):
+        n = len(self) if n is None else n
+        width = self.widths[name]
+        shape = (n, width) if width != 1 else (n,)
+        if n == 0 or width == 0:
+            return np.empty(shape, dtype=COLUMN_TYPES[name])
+        return np.memmap(self._file(name), dtype=COLUMN_TYPES[name], mode='r', shape=shape)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+class TimeSeriesStore(object):
+    # Kho chuỗi thời gian chỉ ghi nối, dạng cột, chia segment theo thời gian
+    # và theo bố cục cột (danh sách dpid-port)
+
+    def __init__(self, root, port_features, segment_seconds=SEGMENT_SECONDS):
+        self.root = root
+        self.port_features = port_features
+        self.segment_seconds = segment_seconds
+        self.current = None  # Thư mục gốc chỉ được tạo khi ghi segment đầu tiên
+
+    def segment_paths(self):
+        if not os.path.isdir(self.root):
+            return []
+        names = sorted(n for n in os.listdir(self.root) if os.path.exists(os.path.join(self.root, n, 'meta.json')))
+        return [os.path.join(self.root, n) for n in names]
+
+    def _start_of(self, timestamp):
+        return int(timestamp // self.segment_seconds * self.segment_seconds)
+
+    def append(self, timestamp, status, vector, columns, p_normal, flags):
+        start = self._start_of(timestamp)
+        widths = {
+            'timestamp': 1,
+            'status': 1,
+            'vector': len(vector),
+            'p_normal': len(p_normal),
+            'flags': len(flags),
+        }
+        seg = self.current
+        if seg is None or seg.meta['start'] != start or seg.columns != list(columns) or seg.widths != widths:
+            if seg is not None:
+                seg.close()
+            n = sum(1 for p in self.segment_paths() if os.path.basename(p).startswith(f"{start:010d}-"))
+            seg = self.current = Segment.create(os.path.join(self.root, f"{start:010d}-{n:03d}"),
+                                                start, columns, widths)
+        seg.append(timestamp=timestamp, status=status, vector=vector, p_normal=p_normal, flags=flags)
+
+    def query(self, t_from=None, t_to=None, dpid=None, port=None):
+        # Trả về một phần kết quả cho mỗi segment giao với [t_from, t_to)
+        results = []
+        for path in self.segment_paths():
+            seg = Segment.open(path)
+            start = seg.meta['start']
+            if t_from is not None and start + self.segment_seconds <= t_from:
+                continue
+            if t_to is not None and start >= t_to:
+                continue
+
+            n = len(seg)
+            ts = seg.read('timestamp', n)
+            lo = 0 if t_from is None else np.searchsorted(ts, t_from, side='left')
+            hi = len(ts) if t_to is None else np.searchsorted(ts, t_to, side='left')
+            if lo >= hi:
+                continue
+
+            keys = [j for j, key in enumerate(seg.columns)
+                    if (dpid is None or key.split('-')[0] == str(dpid))
+                    and (port is None or key.split('-')[1] == str(port))]
+            if not keys:
+                continue
+            cols = (np.asarray(keys)[:, None] * self.port_features + np.arange(self.port_features)).ravel()
+            p_normal = seg.read('p_normal', n)[lo:hi]
+            flags = seg.read('flags', n)[lo:hi]
+            # Ở chế độ port, xác suất và cờ có một giá trị cho mỗi cổng
+            if p_normal.ndim == 2 and seg.widths['p_normal'] == len(seg.columns):
+                p_normal = p_normal[:, keys]
+            if flags.ndim == 2 and seg.widths['flags'] == len(seg.columns):
+                flags = flags[:, keys]
+
+            results.append({
+                'columns': [seg.columns[j] for j in keys],
+                'timestamp': np.array(ts[lo:hi]),
+                'status': np.array(seg.read('status', n)[lo:hi]),
+                'vector': np.array(seg.read('vector', n)[lo:hi][:, cols]),
+                'p_normal': np.array(p_normal),
+                'flags': np.array(flags),
+            })
+        return results
+
+    def tail(self, n):
+        # n dòng mới nhất theo bố cục cột của segment cuối cùng, đi lùi qua các segment
+        # trước (qua mốc giờ, khởi động lại) khi bố cục của chúng trùng hoặc là phần đầu
+        # của bố cục đó (cột chưa có được điền 0); dừng ở segment không tương thích
+        paths = self.segment_paths()
+        columns, parts, count = None, [], 0
+        for path in reversed(paths):
+            seg = Segment.open(path)
+            total = len(seg)
+            if total == 0:
+                continue
+            if columns is None:
+                columns = seg.columns
+            elif seg.columns != columns[:len(seg.columns)]:
+                break
+            lo = max(0, total - (n - count))
+            vector = np.zeros((total - lo, self.port_features * len(columns)))
+            vector[:, :seg.widths['vector']] = seg.read('vector', total)[lo:]
+            parts.append((np.array(seg.read('timestamp', total)[lo:]),
+                          np.array(seg.read('status', total)[lo:]), vector))
+            count += total - lo
+            if count >= n:
+                break
+        if not parts:
+            return None
+        parts.reverse()
+        return {
+            'columns': columns,
+            'timestamp': np.concatenate([p[0] for p in parts]),
+            'status': np.concatenate([p[1] for p in parts]),
+            'vector': np.concatenate([p[2] for p in parts]),
+        }
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None